@@ -1,10 +1,17 @@
 import os, platform, json, shutil, time, re, zipfile, piexif, logging, random
-import queue, hashlib, threading, bisect, subprocess
-from datetime import datetime
+import queue, hashlib, threading, bisect, subprocess, sqlite3, errno
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Iterable, Tuple, List, Dict, Any
-from collections import deque
+from array import array
+from collections import deque, namedtuple
 from fractions import Fraction
+from types import SimpleNamespace
+from ctypes import CDLL, c_int, c_size_t, c_void_p, c_wchar_p
+from ctypes.util import find_library
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from concurrent.futures import ThreadPoolExecutor
 
 # External libraries
 from mutagen import File
@@ -15,6 +22,12 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from xml.etree import ElementTree
 
+# Optional, evaluates sorting criteria over whole columns for big folders
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Local import
 from main import get_config_path
 
@@ -25,7 +38,9 @@ if IS_WINDOWS:
     import ctypes
     from ctypes import wintypes
     import send2trash
+    resource = None
 else:
+    import resource                                     #   Memory cap of extraction workers
     # Linux/Mac placeholders
     win32gui = None
     win32con = None
@@ -39,153 +54,464 @@ else:
 
 #region Opening a folder
 
-def open_folder(folder):
-    """Returns a list of all files (their paths) in a selected folder"""
-    if folder:
-        folderList = [] 
-        for root, dirs, files in os.walk(folder): 
-            for file in files:
-                file_path = os.path.join(root, file)
-                folderList.append(file_path)
-        return folderList
+# One file found by scan_folder. stat is the DirEntry stat result, reused by every later step
+FileRecord = namedtuple('FileRecord', ['path', 'name', 'stat'])
 
-#region get many file info
+# Folders that are rarely worth sorting, offered as the default exclusions
+DEFAULT_EXCLUDES = ['.git/', '.hg/', '.svn/', 'node_modules/', '__pycache__/', '.venv/', 'venv/',
+                    '.tox/', '.cache/', '.mypy_cache/', '.pytest_cache/']
 
-def get_file_info(file_path):
-    """Returns a dictionary containing properties of a selected file"""
-    if file_path:
-        fileDict = {}
-        try:
-            fileDict['Full Name'] = os.path.basename(file_path)
-            fileDict['Name'] = os.path.splitext(os.path.basename(file_path))[0]
-            fileDict['Extension'] = os.path.splitext(file_path)[1]
-            fileDict['Directory'] = os.path.dirname(file_path)
-            fileDict['Path'] = file_path
-            stats = os.stat(file_path) 
-            fileDict['Size'] = format_size(stats.st_size)
-            
-            # Cross-platform creation time
-            if IS_WINDOWS:
-                fileDict['Created'] = datetime.fromtimestamp(stats.st_birthtime).strftime('%d-%m-%Y')
+class ScanFilter:
+    """
+    What scan_folder() leaves out. Applied while walking, so an excluded folder
+    is never listed and its files are never stat'ed.
+
+    excludes are gitignore-style globs, checked in order with the last match winning:
+      name        a file or folder with this name anywhere ('*.tmp', 'node_modules')
+      name/       only folders ('build/')
+      a/b, /a     a path relative to the scanned folder ('docs/*.pdf', '/build')
+      **          any number of folders ('**/cache', 'logs/**/*.gz')
+      !pattern    takes back an exclusion of an earlier pattern ('*.log', '!keep.log')
+    max_depth   None for no limit, 0 lists only the scanned folder itself
+    skip_hidden leaves out files and folders starting with a dot
+    one_filesystem does not enter mount points of other filesystems
+    apply_to_sorting tells the Sorting page to leave the same files out when it sorts,
+                off by default so excluded folders are only hidden from the listing
+    """
+    def __init__(self, excludes=(), max_depth=None, skip_hidden=False, one_filesystem=False, apply_to_sorting=False):
+        self.excludes = [p.strip() for p in excludes if p.strip() and not p.strip().startswith('#')]
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+        self.one_filesystem = one_filesystem
+        self.apply_to_sorting = apply_to_sorting
+        self._rules = [self._compile(pattern) for pattern in self.excludes]
+        self._anchored = any(rule[1] for rule in self._rules)
+
+    @classmethod
+    def from_dict(cls, data):
+        """ScanFilter saved by to_dict() (in a profile), a missing dict gives one that excludes nothing"""
+        data = data or {}
+        max_depth = data.get('max_depth')
+        return cls(data.get('excludes', []), int(max_depth) if max_depth not in (None, '') else None,
+                   bool(data.get('skip_hidden')), bool(data.get('one_filesystem')),
+                   bool(data.get('apply_to_sorting')))
+
+    def to_dict(self):
+        return {'excludes': list(self.excludes), 'max_depth': self.max_depth,
+                'skip_hidden': self.skip_hidden, 'one_filesystem': self.one_filesystem,
+                'apply_to_sorting': self.apply_to_sorting}
+
+    def same_walk(self, other):
+        """True if other leaves out exactly the same files (apply_to_sorting aside)"""
+        return (self.excludes, self.max_depth, self.skip_hidden, self.one_filesystem) == \
+               (other.excludes, other.max_depth, other.skip_hidden, other.one_filesystem)
+
+    def is_empty(self):
+        return not self._rules and self.max_depth is None and not self.skip_hidden and not self.one_filesystem
+
+    def describe(self, shown=3):
+        """Short text of what is left out, for the GUI"""
+        parts = []
+        if self.excludes:
+            more = len(self.excludes) - shown
+            parts.append("excluding " + ", ".join(self.excludes[:shown]) + (f" +{more}" if more > 0 else ""))
+        if self.max_depth is not None:
+            parts.append(f"depth {self.max_depth}")
+        if self.skip_hidden:
+            parts.append("no hidden")
+        if self.one_filesystem:
+            parts.append("one filesystem")
+        return "; ".join(parts) if parts else "nothing excluded"
+
+    @staticmethod
+    def _compile(pattern):
+        """(regex, anchored, dir_only, negate) of one exclude pattern"""
+        negate = pattern.startswith('!')
+        if negate:
+            pattern = pattern[1:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.strip('/') if dir_only else pattern
+        anchored = '/' in pattern                       #   Matched against the relative path, not the name
+        pattern = pattern.lstrip('/')
+        regex = ''
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                regex += '(?:.*/)?'
+                i += 3
+            elif pattern.startswith('**', i):
+                regex += '.*'
+                i += 2
+            elif pattern[i] == '*':
+                regex += '[^/]*'
+                i += 1
+            elif pattern[i] == '?':
+                regex += '[^/]'
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+                end = pattern.index(']', i + 2)
+                body = pattern[i + 1:end]
+                regex += '[' + ('^' + body[1:] if body[0] == '!' else body) + ']'
+                i = end + 1
             else:
-                # Linux often doesn't give birthtime, use ctime (metadata change) or mtime
-                try:
-                    fileDict['Created'] = datetime.fromtimestamp(stats.st_birthtime).strftime('%d-%m-%Y')
-                except AttributeError:
-                    fileDict['Created'] = datetime.fromtimestamp(stats.st_ctime).strftime('%d-%m-%Y')
+                regex += re.escape(pattern[i])
+                i += 1
+        return re.compile(regex + r'\Z', re.DOTALL).match, anchored, dir_only, negate
 
-            fileDict['Modified'] = datetime.fromtimestamp(stats.st_mtime).strftime('%d-%m-%Y')
-            fileDict['Accessed'] = datetime.fromtimestamp(stats.st_atime).strftime('%d-%m-%Y')
+    def excluded(self, relative, name, is_dir):
+        """True if a file or folder (path relative to the scanned folder, with '/') is left out"""
+        if self.skip_hidden and name.startswith('.'):
+            return True
+        for match, anchored, dir_only, negate in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if match(relative if anchored else name):
+                return not negate
+        return False
 
-            # Metadata extraction (Cross-platform)
-            audio_formats = ['.ogg', '.mp3', '.flac', '.wav']
-            video_formats = ['.mp4', '.avi', '.mov', '.mkv','.flv']
-            image_formats = ['.png', '.jpg', '.jpeg', '.webp', '.gif', '.avif']
-            
-            if fileDict['Extension'] in audio_formats:
-                fileDict.update({'Length (min)': None, 'Bitrate (kbps)': None,'Sample rate (Hz)': None,
-                                'Channels': None, 'Mode': None,'Bit Depth': None})
-                try:
-                    audio = File(fileDict['Path'])
-                    mode_map = {0: "Stereo", 1: "Joint stereo", 2: "Dual channel", 3: "Mono"}
-                    if hasattr(audio, 'info'):
-                        fileDict['Length (min)'] = round(number=float(audio.info.length/60), ndigits=2)
-                        fileDict['Bitrate (kbps)'] = float(audio.info.bitrate/1000)
-                        fileDict['Sample rate (Hz)'] = float(audio.info.sample_rate)
-                        fileDict['Channels'] = int(audio.info.channels)
-                        # Specific handling for mutagen types
-                        if hasattr(audio.info, 'mode'):
-                            fileDict['Mode'] = f'{mode_map.get(audio.info.mode, "Unknown")}'
-                        if hasattr(audio.info, 'bits_per_sample'):
-                            fileDict['Bit Depth'] = f'{audio.info.bits_per_sample}'
-                except Exception:
-                    pass
+def scan_folder(folder, snapshot=None, scan_filter=None):
+    """
+    Walks folder once with os.scandir and yields a FileRecord for every file,
+    in the same top-down order as os.walk. Symlinked folders are not followed.
+    If a FolderSnapshot is given, every listed directory is recorded in it.
+    A ScanFilter (or the snapshot's one) prunes folders and files while walking.
+    """
+    if not folder:
+        return
+    if scan_filter is None and snapshot is not None:
+        scan_filter = snapshot.scan_filter
+    walk = _FilteredWalk(folder, scan_filter)
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns if snapshot is not None else None
+            subdirs, records = _list_directory(current, walk)
+        except OSError:
+            continue                                    #   No access to this folder
+        if snapshot is not None:
+            snapshot.dirs[current] = (mtime_ns, tuple(subdirs))
+        yield from records
+        stack.extend(reversed(subdirs))
+
+class _FilteredWalk:
+    """Per-walk state of a ScanFilter: the scanned folder's device and path prefix"""
+    def __init__(self, folder, scan_filter):
+        self.filter = scan_filter if scan_filter is not None and not scan_filter.is_empty() else None
+        self.folder = folder
+        self.prefix = os.path.join(folder, '')
+        self.device = None
+        if self.filter is not None and self.filter.one_filesystem:
+            try:
+                self.device = os.stat(folder).st_dev
+            except OSError:
+                pass                                    #   Nothing will be listed anyway
+
+    def relative(self, path):
+        relative = path[len(self.prefix):]
+        return relative.replace(os.sep, '/') if os.sep != '/' else relative
+
+    def depth(self, current):
+        """How many folders below the scanned one current is"""
+        if current == self.folder:
+            return 0
+        return current.count(os.sep, len(self.prefix) - 1)
+
+def _list_directory(current, walk=None):
+    """Returns (subfolder paths, FileRecords) of one directory, raises OSError if it can't be read"""
+    subdirs = []
+    records = []
+    scan_filter = walk.filter if walk is not None else None
+    if scan_filter is not None:
+        max_depth = scan_filter.max_depth
+        enter = max_depth is None or walk.depth(current) < max_depth
+        anchored = scan_filter._anchored
+    with os.scandir(current) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if entry.is_symlink():
+                        continue
+                    if scan_filter is not None:
+                        if not enter or scan_filter.excluded(walk.relative(entry.path) if anchored else None,
+                                                             entry.name, True):
+                            continue
+                        if walk.device is not None and entry.stat(follow_symlinks=False).st_dev != walk.device:
+                            continue                    #   Mount point of another filesystem
+                    subdirs.append(entry.path)
+                    continue
+                if scan_filter is not None and scan_filter.excluded(
+                        walk.relative(entry.path) if anchored else None, entry.name, False):
+                    continue
+                records.append(FileRecord(entry.path, entry.name, entry.stat()))
+            except OSError:
+                continue                                #   Broken link or file removed while scanning
+    return subdirs, records
 
-            if fileDict['Extension'] in video_formats:
-                fileDict.update({'Length (min)': None, 'Bitrate (kbps)': None,'Framerate': None,
-                                'Resolution': None, 'Aspect Ratio': None, 'Codec': None,
-                                'Audio Codec': None, 'Channels': None})
-                try:
-                    media_info = MediaInfo.parse(file_path)
-                    for track in media_info.tracks:
-                        width = getattr(track, "width", None)
-                        height = getattr(track, "height", None)
-                        par = getattr(track, "pixel_aspect_ratio", 1.0)
-                        ratio = Fraction(1, 1)
-                        if width and height:
-                            decimal_ar = float(width) / float(height) * float(par)
-                            ratio = Fraction(decimal_ar).limit_denominator(100)
-
-                        if track.track_type == "Video":
-                            if track.duration:
-                                fileDict['Length (min)'] = round(number=float(track.duration / 60000), ndigits=2)
-                            if track.bit_rate:
-                                fileDict['Bitrate (kbps)'] = float(track.bit_rate/1000)
-                            if track.frame_rate:
-                                fileDict['Framerate'] = float(track.frame_rate)
-                            fileDict['Resolution'] = f'{track.width}x{track.height}'
-                            fileDict['Aspect Ratio'] = f"{ratio.numerator}:{ratio.denominator}"
-                            fileDict['Codec'] = track.format
-                        elif track.track_type == "Audio":
-                            fileDict['Audio Codec'] = track.format
-                            fileDict['Channels'] = track.channel_s
-                except Exception:
-                    pass
-            
-            if fileDict['Extension'] in image_formats:
-                def convert_to_degrees(value):
-                    try:
-                        d = value[0][0] / value[0][1]
-                        m = value[1][0] / value[1][1]
-                        s = value[2][0] / value[2][1]
-                        return d + (m / 60.0) + (s / 3600.0)
-                    except Exception:
-                        return None
-                
-                fileDict.update({
-                    'Resolution': None, 'Aspect Ratio': None, 'Bit Depth': None, 'Color Space': None,
-                    'Compression': None, 'GPS Latitude': None, 'GPS Longitude': None
-                })
+class FolderSnapshot:
+    """
+    Directory mtimes and subfolders of a folder as seen by scan_folder().
+    Adding, removing or renaming a file changes its directory's mtime, so on a
+    rescan a directory with the same mtime is not listed again, only its known
+    files are stat'ed to catch changed contents.
+    """
+    # A directory modified this close to the snapshot could change again within the same mtime tick
+    RACY_NS = 2_000_000_000
 
-                try:
-                    media_info = MediaInfo.parse(file_path)
-                    for track in media_info.tracks:
-                        if track.track_type == "Image":
-                            fileDict['Resolution'] = f"{track.width}x{track.height}" if track.width and track.height else None
-                            if track.width and track.height:
-                                ar = Fraction(track.width / track.height).limit_denominator(100)
-                                fileDict['Aspect Ratio'] = f"{ar.numerator}:{ar.denominator}"
-                            fileDict['Bit Depth'] = getattr(track, "bit_depth", None)
-                            fileDict['Color Space'] = getattr(track, "color_space", None)
-                            fileDict['Compression'] = getattr(track, "compression_mode", None)
-                    
-                    exif_dict = piexif.load(file_path)
-                    gps = exif_dict.get("GPS", {})
+    def __init__(self, folder, scan_filter=None):
+        self.folder = folder
+        self.scan_filter = scan_filter                  #   Rescans leave out the same files
+        self.taken_ns = time.time_ns()
+        self.dirs = {}                                  #   path -> (mtime_ns, subfolder paths)
 
-                    def get_tag(tagset, key):
-                        if key in tagset: return tagset[key]
-                        return None
-                    
-                    gps_lat = get_tag(gps, piexif.GPSIFD.GPSLatitude)
-                    gps_lat_ref = get_tag(gps, piexif.GPSIFD.GPSLatitudeRef)
-                    gps_lon = get_tag(gps, piexif.GPSIFD.GPSLongitude)
-                    gps_lon_ref = get_tag(gps, piexif.GPSIFD.GPSLongitudeRef)
-
-                    if gps_lat and gps_lat_ref and gps_lon and gps_lon_ref:
-                        lat = convert_to_degrees(gps_lat)
-                        lon = convert_to_degrees(gps_lon)
-                        if gps_lat_ref.decode() != "N": lat = -lat
-                        if gps_lon_ref.decode() != "E": lon = -lon
-                        fileDict['GPS Latitude'] = lat
-                        fileDict['GPS Longitude'] = lon
-                except Exception:
-                    pass
+    def unchanged(self, path, mtime_ns):
+        previous = self.dirs.get(path)
+        return previous is not None and previous[0] == mtime_ns and mtime_ns < self.taken_ns - self.RACY_NS
+
+def _stat_known_files(current, rows, table):
+    """
+    Stats the files of rows ({name: row}) in current and yields (row, FileRecord)
+    of the changed ones. Every file found is popped from rows, so what is left
+    there afterwards is gone.
+    """
+    # Stat relative to an open folder handle where the OS allows it, saves the path lookups
+    dir_fd = os.open(current, os.O_RDONLY) if os.stat in os.supports_dir_fd else None
+    try:
+        for name, row in list(rows.items()):
+            try:
+                if dir_fd is not None:
+                    stats = os.stat(name, dir_fd=dir_fd)
+                else:
+                    stats = os.stat(os.path.join(current, name))
+            except OSError:
+                continue
+            del rows[name]
+            if table.stat_changed(row, stats):
+                yield row, FileRecord(os.path.join(current, name), name, stats)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+# Result of rescan_folder(): new FileRecords, (row, FileRecord) pairs of changed files and removed rows
+FolderChanges = namedtuple('FolderChanges', ['added', 'changed', 'removed'])
+
+def rescan_folder(snapshot, table):
+    """
+    Compares the folder of a FolderSnapshot with the files loaded in a FileTable.
+    A file counts as changed when its inode, size or mtime differ.
+    Returns (FolderChanges, new FolderSnapshot).
+    """
+    known = table.rows_by_directory()
+    new_snapshot = FolderSnapshot(snapshot.folder, snapshot.scan_filter)
+    walk = _FilteredWalk(snapshot.folder, snapshot.scan_filter)
+    added, changed, removed = [], [], []
+
+    stack = [snapshot.folder]
+    while stack:
+        current = stack.pop()
+        rows = known.pop(current, {})
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns
+            if snapshot.unchanged(current, mtime_ns):
+                # Same entries as last time, only the files' contents may differ
+                subdirs = list(snapshot.dirs[current][1])
+                records = []
+                changed.extend(_stat_known_files(current, rows, table))
+            else:
+                subdirs, records = _list_directory(current, walk)
+        except OSError:
+            removed.extend(rows.values())               #   Folder gone or no access anymore
+            continue
+        new_snapshot.dirs[current] = (mtime_ns, tuple(subdirs))
+
+        for record in records:
+            row = rows.pop(record.name, None)
+            if row is None:
+                added.append(record)
+            elif table.stat_changed(row, record.stat):
+                changed.append((row, record))
+        removed.extend(rows.values())
+        stack.extend(reversed(subdirs))
+
+    for rows in known.values():                         #   Folders that are not there anymore
+        removed.extend(rows.values())
+    return FolderChanges(added, changed, removed), new_snapshot
+
+def open_folder(folder, scan_filter=None):
+    """Returns a list of all files (their paths) in a selected folder, a ScanFilter leaves some out"""
+    if folder:
+        return [record.path for record in scan_folder(folder, scan_filter=scan_filter)]
+
+#region get many file info
 
+AUDIO_FORMATS = ['.ogg', '.mp3', '.flac', '.wav']
+VIDEO_FORMATS = ['.mp4', '.avi', '.mov', '.mkv','.flv']
+IMAGE_FORMATS = ['.png', '.jpg', '.jpeg', '.webp', '.gif', '.avif']
+PDF_FORMATS = ['.pdf']
+OFFICE_FORMATS = ['.docx', '.xlsx', '.pptx']
+
+# Fields the metadata extractors fill in (see the Metadata extractors region)
+AUDIO_FIELDS = ['Length (min)', 'Bitrate (kbps)', 'Sample rate (Hz)', 'Channels', 'Mode', 'Bit Depth']
+VIDEO_FIELDS = ['Length (min)', 'Bitrate (kbps)', 'Framerate', 'Resolution', 'Aspect Ratio', 'Codec',
+                'Audio Codec', 'Channels']
+IMAGE_FIELDS = ['Resolution', 'Aspect Ratio', 'Bit Depth', 'Color Space', 'Compression']
+GPS_FIELDS = ['GPS Latitude', 'GPS Longitude']
+PDF_FIELDS = ['Pages', 'Title', 'Author']
+OFFICE_FIELDS = ['Title', 'Author']
+CONTENT_FIELDS = ['Content Type']               #   Sniffed from the first bytes of every file
+# Fields rebuilt from the path and stat on every scan, never stored in the cache
+BASIC_FIELDS = ('Full Name', 'Name', 'Extension', 'Directory', 'Path', 'Size', 'Created', 'Modified', 'Accessed')
+# Timestamp fields, stored as nanoseconds since the epoch
+DATE_FIELDS = ('Created', 'Modified', 'Accessed')
+# Media fields compared as numbers by the sorting criteria
+NUMERIC_FIELDS = ('GPS Latitude', 'GPS Longitude', 'Sample rate (Hz)', 'Bitrate (kbps)', 'Framerate',
+                  'Length (min)', 'Channels', 'Bit Depth', 'Pages')
+
+def get_file_info(file_path):
+    """
+    Returns a dictionary containing properties of a selected file.
+    Values are raw: Size in bytes, dates in epoch nanoseconds, numbers as numbers.
+    Use format_field_value() to show them.
+    """
+    return _extract_file_info(file_path)[0]
+
+def plan_fields_for_groups(groups, visible_columns=()):
+    """Media fields needed by the sorting groups' criteria plus the columns shown to the user"""
+    fields = set(visible_columns)
+    for group in groups or []:
+        fields.update(criterion.get('field') for criterion in criteria_leaves(group.get('criteria', [])))
+    return fields.difference(BASIC_FIELDS)
+
+def fields_for_extensions(extensions):
+    """All fields that files with these extensions can have, extracted or not"""
+    fields = list(BASIC_FIELDS)
+    for extension in extensions:
+        fields.extend(field for field in media_fields_for_extension(extension) if field not in fields)
+    return fields
+
+def all_fields():
+    """Every field a file can have with the registered extractors"""
+    fields = list(BASIC_FIELDS)
+    for extractor in EXTRACTORS.values():
+        fields.extend(field for field in extractor.fields if field not in fields)
+    return fields
+
+def _extract_file_info(file_path, stats=None, fields=None, timings=None):
+    """
+    Same as get_file_info, but also reports if any metadata parser failed.
+    fields limits which media fields are extracted (None means all of them but the on-request ones),
+    timings collects the seconds every extractor took.
+    Returns (fileDict, failed).
+    """
+    fileDict = {}
+    failed = False
+    if file_path:
+        try:
+            if stats is None:
+                stats = os.stat(file_path)
+            fileDict.update(_basic_file_info(file_path, stats))
+            media_fields, failed = _media_file_info(file_path, fileDict['Extension'], fields, timings)
+            fileDict.update(media_fields)
         except Exception as e:
             pass
-            
+
+    return fileDict, failed
+
+def _basic_file_info(file_path, stats):
+    """Path and stat based properties, cheap to rebuild on every scan"""
+    fileDict = {}
+    fileDict['Full Name'] = os.path.basename(file_path)
+    fileDict['Name'] = os.path.splitext(os.path.basename(file_path))[0]
+    fileDict['Extension'] = os.path.splitext(file_path)[1]
+    fileDict['Directory'] = os.path.dirname(file_path)
+    fileDict['Path'] = file_path
+    fileDict['Size'] = stats.st_size
+    fileDict['Created'] = created_time_ns(stats)
+    fileDict['Modified'] = stats.st_mtime_ns
+    fileDict['Accessed'] = stats.st_atime_ns
     return fileDict
 
+def created_time_ns(stats):
+    """Cross-platform creation time of a stat result in nanoseconds"""
+    # Linux often doesn't give birthtime, use ctime (metadata change) there
+    birthtime = getattr(stats, 'st_birthtime', None)
+    if birthtime is None:
+        return stats.st_ctime_ns
+    return int(birthtime * 1_000_000_000)
+
+def format_date(timestamp_ns):
+    """Formats a nanosecond timestamp the way dates are shown to the user"""
+    return datetime.fromtimestamp(timestamp_ns / 1_000_000_000).strftime('%d-%m-%Y')
+
+def format_field_value(field, value):
+    """Turns a raw get_file_info() value into the text shown in tables and dropdowns"""
+    if value is None or isinstance(value, str):
+        return value
+    if field == 'Size':
+        return format_size(value)
+    if field in DATE_FIELDS:
+        return format_date(value)
+    return value
+
+def day_range_ns(day, month, year):
+    """Start and end (exclusive) of a local calendar day in epoch nanoseconds"""
+    start = datetime(int(year), int(month), int(day))
+    end = start + timedelta(days=1)
+    return int(start.timestamp()) * 1_000_000_000, int(end.timestamp()) * 1_000_000_000
+
+def _media_file_info(file_path, extension, fields=None, timings=None):
+    """
+    Metadata read from the file contents (the expensive part).
+    Runs the cheapest registered extractors that give the requested fields
+    (None means all fields the extension can have, except on-request ones),
+    falling back to dearer ones when a cheap one can't read the file.
+    Returns (fields, failed) where failed is True if a parser raised.
+    """
+    fileDict = {}
+    if fields is None:
+        remaining = set(default_fields_for_extension(extension))
+    else:
+        remaining = set(media_fields_for_extension(extension)).intersection(fields)
+    if not remaining:
+        return fileDict, False
+
+    tried = set()
+    errors = set()
+    # Opened on first use and shared by every parser below, so the file is opened and read once
+    buffer = FileBuffer(file_path)
+    try:
+        for extractor in extractors_for_extension(extension):
+            if not remaining.intersection(extractor.fields):
+                continue
+            tried.update(extractor.fields)
+            try:
+                # Only extractors with magic bytes look at the head, MediaInfo opens the file itself
+                if extractor.magic and not extractor.handles(buffer.peek(16)):
+                    continue
+                started = time.perf_counter()
+                try:
+                    result = extractor.extract(file_path, buffer)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    extractor.observe(elapsed)
+                    if timings is not None:
+                        timings[extractor.name] = elapsed
+            except Exception:
+                errors.update(extractor.fields)
+                continue
+            if result is None:
+                continue                        #   Not a file it can read, a dearer extractor may
+            for field in extractor.fields:
+                fileDict.setdefault(field, result.get(field))
+            remaining.difference_update(extractor.fields)
+    finally:
+        buffer.close()
+
+    # Fields nobody could read are known to be empty, so they are not extracted again
+    for field in remaining | tried:
+        fileDict.setdefault(field, None)
+    return fileDict, bool(errors & remaining)
+
 def format_size(bytes):
     for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
         if bytes < 1024.0:
@@ -193,6 +519,2030 @@ def format_size(bytes):
         bytes /= 1024.0
     return f"{bytes:.2f} PB"
 
+#region Shared file reader
+
+class FileBuffer:
+    """
+    Reads the head of a file once (and the tail when asked) and hands the same
+    bytes to every metadata parser, so one file costs one open and one read.
+    The file is only opened on first use.
+    """
+    HEAD_BYTES = 64 * 1024
+    TAIL_BYTES = 64 * 1024
+
+    def __init__(self, path, head_size=None):
+        self.path = path
+        self.head_size = head_size or self.HEAD_BYTES
+        self.stat = None
+        self._file = None
+        self._head = None
+        self._peek = None
+        self._tail = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+            self.stat = os.fstat(self._file.fileno())
+            if hasattr(os, 'posix_fadvise'):
+                try:                            #   Read once, don't push other files out of the page cache
+                    os.posix_fadvise(self._file.fileno(), 0, 0, os.POSIX_FADV_NOREUSE)
+                except OSError:
+                    pass
+        return self._file
+
+    @property
+    def size(self):
+        self._open()
+        return self.stat.st_size
+
+    @property
+    def head(self):
+        """memoryview of the first head_size bytes"""
+        if self._head is None:
+            f = self._open()
+            f.seek(0)
+            self._head = memoryview(f.read(self.head_size))
+        return self._head
+
+    def peek(self, size):
+        """memoryview of the first size bytes, only those are read while the head isn't needed"""
+        if self._head is None and size < self.head_size:
+            if self._peek is None or len(self._peek) < size:
+                f = self._open()
+                f.seek(0)
+                self._peek = memoryview(f.read(size))
+            return self._peek[:size]
+        return self.head[:size]
+
+    @property
+    def tail(self):
+        """memoryview of the last TAIL_BYTES bytes (overlaps head on small files)"""
+        if self._tail is None:
+            start = max(0, self.size - self.TAIL_BYTES)
+            if start + self.TAIL_BYTES <= len(self.head):
+                self._tail = self.head[start:]
+            else:
+                f = self._open()
+                f.seek(start)
+                self._tail = memoryview(f.read(self.TAIL_BYTES))
+        return self._tail
+
+    def read_at(self, offset, size):
+        """Returns bytes at offset, served from the head or tail when they cover the range"""
+        head = self.head
+        if offset + size <= len(head):
+            return head[offset:offset + size]
+        tail_start = self.size - len(self.tail)
+        if offset >= tail_start:
+            return self.tail[offset - tail_start:offset - tail_start + size]
+        f = self._open()
+        f.seek(offset)
+        return f.read(size)
+
+    def read_all(self):
+        """Whole file contents, reusing the head that was already read"""
+        head = self.head
+        if len(head) >= self.size:
+            return bytes(head)
+        f = self._open()
+        f.seek(len(head))
+        return bytes(head) + f.read()
+
+    def fileobj(self):
+        """The underlying file rewound to the start, for parsers that need to seek themselves"""
+        f = self._open()
+        f.seek(0)
+        return f
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _jpeg_segments(read_at):
+    """Yields (marker, offset, length) of JPEG segments up to the start of scan"""
+    offset = 2
+    while True:
+        head = read_at(offset, 4)
+        if len(head) < 2 or head[0] != 0xFF:
+            return
+        marker = head[1]
+        if marker == 0xFF:                      #   Fill byte before a marker
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2                         #   Markers without a length
+            continue
+        if marker in (0xD9, 0xDA) or len(head) < 4:
+            return                              #   End of image or start of scan
+        length = int.from_bytes(head[2:4], 'big')
+        if length < 2:
+            return
+        yield marker, offset, length
+        offset += 2 + length
+
+def _exif_payload(buffer):
+    """Raw EXIF block of a JPEG, PNG or WebP in a form piexif.load() accepts, or None"""
+    head = buffer.head
+    if head[:2] == b'\xff\xd8':
+        for marker, offset, length in _jpeg_segments(buffer.read_at):
+            if marker == 0xE1:
+                payload = bytes(buffer.read_at(offset + 4, length - 2))
+                if payload[:6] == b'Exif\x00\x00':
+                    return payload
+            elif marker in JPEG_SOF_MARKERS:
+                return None                     #   EXIF always comes before the frame
+        return None
+
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        offset = 8
+        while True:
+            chunk = buffer.read_at(offset, 8)
+            if len(chunk) < 8 or chunk[4:8] in (b'IDAT', b'IEND'):
+                return None
+            length = int.from_bytes(chunk[:4], 'big')
+            if chunk[4:8] == b'eXIf':
+                return b'Exif\x00\x00' + bytes(buffer.read_at(offset + 8, length))
+            offset += 12 + length
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return buffer.read_all()
+    return None
+
+def read_exif(buffer):
+    """piexif dict of the image behind a FileBuffer, or None if it has no EXIF"""
+    payload = _exif_payload(buffer)
+    return piexif.load(payload) if payload else None
+
+#region Image header probing
+
+PNG_COLOR_TYPES = {0: 'Y', 2: 'RGB', 3: 'RGB', 4: 'YA', 6: 'RGBA'}
+JPEG_COLOR_TYPES = {1: 'Y', 3: 'YUV', 4: 'CMYK'}
+# SOF markers carry the frame size, C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frames
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_LOSSLESS_MARKERS = {0xC3, 0xC7, 0xCB, 0xCF}
+
+def probe_image_header(data, read_at=None):
+    """
+    Reads image properties from the first bytes of a PNG, JPEG, GIF or WebP file.
+
+    data:    bytes or memoryview from the start of the file (FileBuffer.head)
+    read_at: optional read_at(offset, size) callback, lets JPEG parsing continue
+             past data when the frame header comes after large metadata segments
+
+    Returns a dict with width, height, bit_depth, color_type and compression,
+    or None if the format is not recognised or the header is incomplete.
+    """
+    try:
+        if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+            width, height = int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+            bit_depth, color_type = data[24], data[25]
+            return {'width': width, 'height': height, 'bit_depth': bit_depth,
+                    'color_type': PNG_COLOR_TYPES.get(color_type), 'compression': 'Lossless'}
+
+        if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 11:
+            width, height = int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+            return {'width': width, 'height': height, 'bit_depth': ((data[10] >> 4) & 0x07) + 1,
+                    'color_type': 'RGB', 'compression': 'Lossless'}
+
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return _probe_webp(data)
+
+        if data[:2] == b'\xff\xd8':
+            return _probe_jpeg(data, read_at)
+    except (IndexError, ValueError):
+        pass
+    return None
+
+def _probe_webp(data):
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and data[23:26] == b'\x9d\x01\x2a':
+        width = int.from_bytes(data[26:28], 'little') & 0x3FFF
+        height = int.from_bytes(data[28:30], 'little') & 0x3FFF
+        return {'width': width, 'height': height, 'bit_depth': 8, 'color_type': 'YUV', 'compression': 'Lossy'}
+    if chunk == b'VP8L' and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], 'little')
+        has_alpha = (bits >> 28) & 1
+        return {'width': (bits & 0x3FFF) + 1, 'height': ((bits >> 14) & 0x3FFF) + 1, 'bit_depth': 8,
+                'color_type': 'RGBA' if has_alpha else 'RGB', 'compression': 'Lossless'}
+    if chunk == b'VP8X' and len(data) >= 30:
+        has_alpha = data[20] & 0x10
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return {'width': width, 'height': height, 'bit_depth': 8,
+                'color_type': 'RGBA' if has_alpha else None, 'compression': None}
+    return None
+
+def _probe_jpeg(data, read_at=None):
+    """Walks JPEG segments until the SOF frame header"""
+    def get(offset, size):
+        if offset + size <= len(data) or read_at is None:
+            return data[offset:offset + size]
+        # Frame header is further away, read only the next segment header from the file
+        return read_at(offset, size)
+
+    for marker, offset, length in _jpeg_segments(get):
+        if marker in JPEG_SOF_MARKERS:
+            frame = get(offset + 4, 6)
+            if len(frame) < 6:
+                return None
+            precision = frame[0]
+            height = int.from_bytes(frame[1:3], 'big')
+            width = int.from_bytes(frame[3:5], 'big')
+            return {'width': width, 'height': height, 'bit_depth': precision,
+                    'color_type': JPEG_COLOR_TYPES.get(frame[5]),
+                    'compression': 'Lossless' if marker in JPEG_LOSSLESS_MARKERS else 'Lossy'}
+    return None
+
+def _image_header_fields(header):
+    """Converts probe_image_header() output into the image columns"""
+    width, height = header['width'], header['height']
+    fields = {'Resolution': None, 'Aspect Ratio': None, 'Bit Depth': header['bit_depth'],
+              'Color Space': header['color_type'], 'Compression': header['compression']}
+    if width and height:
+        fields['Resolution'] = f"{width}x{height}"
+        ar = Fraction(width / height).limit_denominator(100)
+        fields['Aspect Ratio'] = f"{ar.numerator}:{ar.denominator}"
+    return fields
+
+#region Content type sniffing
+
+SNIFF_BYTES = 512                               #   Read from the start of a file to tell its type
+
+# (pattern over the first SNIFF_BYTES, MIME type, family), tried top to bottom so
+# the more specific signatures of a container come before the generic one
+CONTENT_SIGNATURES = [
+    (rb'\x89PNG\r\n\x1a\n', 'image/png', 'image'),
+    (rb'\xff\xd8\xff', 'image/jpeg', 'image'),
+    (rb'GIF8[79]a', 'image/gif', 'image'),
+    (rb'RIFF.{4}WEBP', 'image/webp', 'image'),
+    (rb'.{4}ftyp(?:avif|avis)', 'image/avif', 'image'),
+    (rb'.{4}ftyp(?:heic|heix|heim|heis|mif1|msf1)', 'image/heic', 'image'),
+    (rb'BM.{4}\x00\x00\x00\x00', 'image/bmp', 'image'),
+    (rb'II\*\x00|MM\x00\*', 'image/tiff', 'image'),
+    (rb'\x00\x00\x01\x00', 'image/x-icon', 'image'),
+    (rb'8BPS', 'image/vnd.adobe.photoshop', 'image'),
+    (rb'(?:\xef\xbb\xbf)?\s*(?:<\?xml[^>]*>\s*)?(?:<!--.*?-->\s*)*(?:<!DOCTYPE svg[^>]*>\s*)?<svg', 'image/svg+xml', 'image'),
+    (rb'ID3|\xff[\xfb\xf3\xf2\xe3]', 'audio/mpeg', 'audio'),
+    (rb'fLaC', 'audio/flac', 'audio'),
+    (rb'OggS.{20,80}?\x80theora', 'video/ogg', 'video'),
+    (rb'OggS', 'audio/ogg', 'audio'),
+    (rb'RIFF.{4}WAVE', 'audio/wav', 'audio'),
+    (rb'FORM.{4}AIF[FC]', 'audio/aiff', 'audio'),
+    (rb'.{4}ftypM4[AB]', 'audio/mp4', 'audio'),
+    (rb'MThd', 'audio/midi', 'audio'),
+    (rb'#!AMR', 'audio/amr', 'audio'),
+    (rb'RIFF.{4}AVI ', 'video/x-msvideo', 'video'),
+    (rb'.{4}ftypqt  ', 'video/quicktime', 'video'),
+    (rb'.{4}ftyp3g', 'video/3gpp', 'video'),
+    (rb'.{4}ftyp', 'video/mp4', 'video'),
+    (rb'\x1aE\xdf\xa3.{0,64}?webm', 'video/webm', 'video'),
+    (rb'\x1aE\xdf\xa3', 'video/x-matroska', 'video'),
+    (rb'FLV\x01', 'video/x-flv', 'video'),
+    (rb'\x00\x00\x01[\xba\xb3]', 'video/mpeg', 'video'),
+    (rb'G.{187}G.{187}G', 'video/mp2t', 'video'),
+    (rb'0&\xb2u\x8ef\xcf\x11', 'video/x-ms-asf', 'video'),
+    (rb'%PDF-', 'application/pdf', 'document'),
+    (rb'%!PS', 'application/postscript', 'document'),
+    (rb'\{\\rtf', 'application/rtf', 'document'),
+    (rb'PK\x03\x04.{26}mimetypeapplication/epub\+zip', 'application/epub+zip', 'document'),
+    (rb'PK\x03\x04.{26}mimetypeapplication/vnd\.oasis\.opendocument\.text', 'application/vnd.oasis.opendocument.text', 'document'),
+    (rb'PK\x03\x04.{26}mimetypeapplication/vnd\.oasis\.opendocument\.spreadsheet', 'application/vnd.oasis.opendocument.spreadsheet', 'document'),
+    (rb'PK\x03\x04.{26}mimetypeapplication/vnd\.oasis\.opendocument\.presentation', 'application/vnd.oasis.opendocument.presentation', 'document'),
+    (rb'PK\x03\x04.*?word/', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'document'),
+    (rb'PK\x03\x04.*?xl/', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'document'),
+    (rb'PK\x03\x04.*?ppt/', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', 'document'),
+    (rb'PK\x03\x04|PK\x05\x06', 'application/zip', 'archive'),
+    (rb'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage', 'document'),
+    (rb'Rar!\x1a\x07', 'application/vnd.rar', 'archive'),
+    (rb"7z\xbc\xaf'\x1c", 'application/x-7z-compressed', 'archive'),
+    (rb'\x1f\x8b', 'application/gzip', 'archive'),
+    (rb'BZh[1-9]', 'application/x-bzip2', 'archive'),
+    (rb'\xfd7zXZ\x00', 'application/x-xz', 'archive'),
+    (rb'\x28\xb5\x2f\xfd', 'application/zstd', 'archive'),
+    (rb'.{257}ustar', 'application/x-tar', 'archive'),
+    (rb'MSCF', 'application/vnd.ms-cab-compressed', 'archive'),
+    (rb'\x7fELF', 'application/x-executable', 'executable'),
+    (rb'MZ', 'application/x-msdownload', 'executable'),
+    (rb'\xca\xfe\xba\xbe|\xfe\xed\xfa[\xce\xcf]|[\xce\xcf]\xfa\xed\xfe', 'application/x-mach-binary', 'executable'),
+    (rb'\x00asm', 'application/wasm', 'executable'),
+    (rb'wOFF', 'font/woff', 'font'),
+    (rb'wOF2', 'font/woff2', 'font'),
+    (rb'OTTO', 'font/otf', 'font'),
+    (rb'\x00\x01\x00\x00\x00', 'font/ttf', 'font'),
+    (rb'ttcf', 'font/collection', 'font'),
+    (rb'SQLite format 3\x00', 'application/vnd.sqlite3', 'data'),
+    (rb'#!', 'text/x-script', 'text'),
+    (rb'(?:\xef\xbb\xbf)?\s*(?i:<!DOCTYPE html|<html|<head|<body)', 'text/html', 'text'),
+    (rb'(?:\xef\xbb\xbf)?\s*<\?xml', 'application/xml', 'text'),
+]
+
+# Generic containers the extension narrows down, the contents still decide the family
+CONTAINER_EXTENSIONS = {
+    ('application/zip', '.jar'): 'application/java-archive',
+    ('application/zip', '.apk'): 'application/vnd.android.package-archive',
+    ('application/zip', '.docx'): 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    ('application/zip', '.xlsx'): 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    ('application/zip', '.pptx'): 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    ('application/x-ole-storage', '.doc'): 'application/msword',
+    ('application/x-ole-storage', '.xls'): 'application/vnd.ms-excel',
+    ('application/x-ole-storage', '.ppt'): 'application/vnd.ms-powerpoint',
+    ('application/x-ole-storage', '.msi'): 'application/x-msi',
+    ('text/plain', '.csv'): 'text/csv',
+    ('text/plain', '.json'): 'application/json',
+    ('text/plain', '.md'): 'text/markdown',
+}
+
+CONTENT_FAMILIES = {mime: family for _, mime, family in CONTENT_SIGNATURES}
+CONTENT_FAMILIES.update({
+    'application/java-archive': 'archive', 'application/vnd.android.package-archive': 'archive',
+    'application/msword': 'document', 'application/vnd.ms-excel': 'document',
+    'application/vnd.ms-powerpoint': 'document', 'application/x-msi': 'executable',
+    'text/plain': 'text', 'text/csv': 'text', 'application/json': 'text', 'text/markdown': 'text',
+    'application/octet-stream': 'data', 'inode/x-empty': 'data',
+})
+CONTENT_FAMILY_NAMES = sorted(set(CONTENT_FAMILIES.values()))
+
+# One pattern for the whole table, the name of the group that matched is the row index
+_content_signature = re.compile(b'|'.join(b'(?P<s%d>%s)' % (index, pattern)
+                                          for index, (pattern, _, _) in enumerate(CONTENT_SIGNATURES)), re.DOTALL)
+# Bytes that occur in text, anything left after deleting them means binary data
+_text_bytes = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+def sniff_content_type(data, extension=''):
+    """MIME type of a file from its first SNIFF_BYTES bytes, the extension only refines generic containers"""
+    data = bytes(data[:SNIFF_BYTES])
+    if not data:
+        return 'inode/x-empty'
+    match = _content_signature.match(data)
+    if match:
+        content_type = CONTENT_SIGNATURES[int(match.lastgroup[1:])][1]
+    elif not data.translate(None, _text_bytes):
+        content_type = 'text/plain'
+    else:
+        content_type = 'application/octet-stream'
+    return CONTAINER_EXTENSIONS.get((content_type, (extension or '').lower()), content_type)
+
+def sniff_file(file_path):
+    """Reads the start of a file and returns its MIME type, raises OSError if it can't be read"""
+    with open(file_path, 'rb') as f:
+        return sniff_content_type(f.read(SNIFF_BYTES), os.path.splitext(file_path)[1])
+
+def content_family(content_type):
+    """'image', 'video', 'document', ... for a MIME type, 'data' if it is unknown"""
+    family = CONTENT_FAMILIES.get(content_type)
+    if family is None:
+        top = (content_type or '').split('/')[0]
+        family = top if top in ('image', 'audio', 'video', 'text', 'font') else 'data'
+    return family
+
+def content_type_matches(content_type, value):
+    """True if content_type is value, where value is a MIME type, a family or a wildcard like 'image/*'"""
+    if not content_type or not value:
+        return False
+    value = str(value).strip().lower()
+    if value.endswith('/*'):
+        return content_type.startswith(value[:-1])
+    return value == content_type or value == content_family(content_type)
+
+def sniff_files(file_paths, cache=None):
+    """
+    Content Type of every path that exists, {path: MIME type}. Unchanged files are
+    served from the metadata cache, the others are sniffed and cached for next time.
+    """
+    if cache is None:
+        cache = get_metadata_cache()
+    file_paths = list(file_paths)
+    stats_list = []
+    for path in file_paths:
+        try:
+            stats_list.append(os.stat(path))
+        except OSError:
+            stats_list.append(None)
+    cached = cache.get_many(stats_list) if cache else {}
+
+    content_types = {}
+    for index, (path, stats) in enumerate(zip(file_paths, stats_list)):
+        if stats is None:
+            continue
+        fields, failed, done = cached.get(index, ({}, False, set()))
+        if 'Content Type' in fields:
+            content_types[path] = fields['Content Type']
+            continue
+        try:
+            content_types[path] = sniff_file(path)
+        except OSError:
+            content_types[path] = None
+            continue
+        if cache:
+            cache.put(stats, {**fields, 'Content Type': content_types[path]}, failed, done | {'content-type'})
+    if cache:
+        cache.flush()
+    return content_types
+
+#region Metadata extractors
+
+class Extractor:
+    """
+    A metadata parser the scanner can pick. extract(path, buffer) gets the path and
+    the shared FileBuffer and returns a dict of its fields, None if the file is not
+    one it can read (a dearer extractor is tried then), or raises if parsing failed.
+
+    name:       stable id, stored in the metadata cache
+    extensions: lower case extensions it reads, None for files of any extension
+    fields:     fields it fills in
+    cost:       expected seconds per file, kept up to date from measurements
+    magic:      byte prefixes one of which the file must start with (empty: any file)
+    on_request: only runs when one of its fields is asked for by name, not when all fields are
+    """
+    COST_WEIGHT = 0.1                           #   Weight of a new measurement in the moving average
+
+    def __init__(self, name, extract, extensions, fields, cost, magic=(), on_request=False):
+        self.name = name
+        self.extract = extract
+        self.extensions = None if extensions is None else frozenset(extensions)
+        self.fields = tuple(fields)
+        self.cost = cost
+        self.magic = tuple(magic)
+        self.on_request = on_request
+        self.enabled = True
+        self.bit = 0                            #   Set by register_extractor, used by FileTable
+
+    def reads(self, extension):
+        return self.extensions is None or extension in self.extensions
+
+    def handles(self, head):
+        return not self.magic or bytes(head[:16]).startswith(self.magic)
+
+    def observe(self, seconds):
+        self.cost += self.COST_WEIGHT * (seconds - self.cost)
+
+# Registered extractors by name, in registration order
+EXTRACTORS = {}
+_extension_fields = {}
+
+def register_extractor(extractor):
+    """Adds a metadata extractor, it is picked for its extensions from then on"""
+    if extractor.name not in EXTRACTORS:
+        extractor.bit = 1 << len(EXTRACTORS)
+    else:
+        extractor.bit = EXTRACTORS[extractor.name].bit
+    EXTRACTORS[extractor.name] = extractor
+    _extension_fields.clear()
+    return extractor
+
+def extractors_for_extension(extension):
+    """Enabled extractors that read files with this extension, cheapest first"""
+    extension = (extension or '').lower()
+    return sorted((extractor for extractor in EXTRACTORS.values()
+                   if extractor.enabled and extractor.reads(extension)), key=lambda e: e.cost)
+
+def media_fields_for_extension(extension):
+    """Media fields files with this extension can get, in registration order"""
+    fields = _extension_fields.get(extension)
+    if fields is None:
+        fields = []
+        for extractor in EXTRACTORS.values():
+            if extractor.enabled and extractor.reads((extension or '').lower()):
+                fields.extend(field for field in extractor.fields if field not in fields)
+        fields = _extension_fields[extension] = tuple(fields)
+    return fields
+
+def default_fields_for_extension(extension):
+    """Media fields a full extraction (fields=None) gives files with this extension"""
+    on_request = {field for extractor in EXTRACTORS.values() if extractor.on_request for field in extractor.fields}
+    return tuple(field for field in media_fields_for_extension(extension) if field not in on_request)
+
+def extractors_done(extension, fileDict):
+    """Extractors of this extension whose fields are all in fileDict"""
+    return [extractor for extractor in extractors_for_extension(extension)
+            if all(field in fileDict for field in extractor.fields)]
+
+def observe_costs(timings):
+    """Feeds extractor timings measured in a worker process into the cost model"""
+    for name, seconds in timings.items():
+        if name in EXTRACTORS:
+            EXTRACTORS[name].observe(seconds)
+
+# MediaInfo parameters the extractors read, mapped to pymediainfo's track attribute names
+MEDIAINFO_ATTRIBUTES = {
+    'Width': 'width', 'Height': 'height', 'PixelAspectRatio': 'pixel_aspect_ratio', 'Duration': 'duration',
+    'BitRate': 'bit_rate', 'FrameRate': 'frame_rate', 'Format': 'format', 'Channel(s)': 'channel_s',
+    'BitDepth': 'bit_depth', 'ColorSpace': 'color_space', 'Compression_Mode': 'compression_mode',
+}
+VIDEO_PARAMETERS = ['Width', 'Height', 'PixelAspectRatio', 'Duration', 'BitRate', 'FrameRate', 'Format']
+AUDIO_TRACK_PARAMETERS = ['Format', 'Channel(s)']
+IMAGE_PARAMETERS = ['Width', 'Height', 'BitDepth', 'ColorSpace', 'Compression_Mode']
+
+class MediaInfoSession:
+    """
+    One libmediainfo handle reused for every file a process reads. Only the
+    parameters the extractors use are asked for, instead of the full report
+    that MediaInfo.parse() builds and parses back for every file.
+    """
+    STREAM_KINDS = {'General': 0, 'Video': 1, 'Audio': 2, 'Text': 3, 'Other': 4, 'Image': 5}
+    INFO_TEXT = 1
+    PARSE_SPEED = '0.5'                         #   Same as MediaInfo.parse() uses
+
+    def __init__(self, library):
+        self._lib = library
+        library.MediaInfo_New.restype = c_void_p
+        library.MediaInfo_Option.argtypes = [c_void_p, c_wchar_p, c_wchar_p]
+        library.MediaInfo_Option.restype = c_wchar_p
+        library.MediaInfo_Open.argtypes = [c_void_p, c_wchar_p]
+        library.MediaInfo_Open.restype = c_size_t
+        library.MediaInfo_Count_Get.argtypes = [c_void_p, c_int, c_size_t]
+        library.MediaInfo_Count_Get.restype = c_size_t
+        library.MediaInfo_Get.argtypes = [c_void_p, c_int, c_size_t, c_wchar_p, c_int, c_int]
+        library.MediaInfo_Get.restype = c_wchar_p
+        library.MediaInfo_Close.argtypes = [c_void_p]
+        library.MediaInfo_Delete.argtypes = [c_void_p]
+
+        self._handle = library.MediaInfo_New()
+        library.MediaInfo_Option(self._handle, 'ParseSpeed', self.PARSE_SPEED)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        """Session on the system libmediainfo, None if it can't be found"""
+        loader = CDLL
+        if IS_WINDOWS:
+            from ctypes import WinDLL as loader
+        for name in (find_library('mediainfo'), 'libmediainfo.so.0', 'libmediainfo.0.dylib', 'MediaInfo.dll'):
+            if not name:
+                continue
+            try:
+                return cls(loader(name))
+            except (OSError, AttributeError):
+                continue
+        return None
+
+    def tracks(self, path, parameters):
+        """
+        Tracks of the stream kinds in parameters ({'Video': [parameter, ...]}) as
+        objects with the same attribute names pymediainfo tracks have.
+        """
+        with self._lock:
+            if not self._lib.MediaInfo_Open(self._handle, path):
+                raise OSError(f'MediaInfo could not open {path}')
+            try:
+                tracks = []
+                for kind, names in parameters.items():
+                    kind_id = self.STREAM_KINDS[kind]
+                    for number in range(self._lib.MediaInfo_Count_Get(self._handle, kind_id, -1)):
+                        track = SimpleNamespace(track_type=kind)
+                        for name in names:
+                            value = self._lib.MediaInfo_Get(self._handle, kind_id, number, name, self.INFO_TEXT, 0)
+                            setattr(track, MEDIAINFO_ATTRIBUTES[name], _mediainfo_value(value))
+                        tracks.append(track)
+                return tracks
+            finally:
+                self._lib.MediaInfo_Close(self._handle)
+
+def _mediainfo_value(text):
+    """Converts a MediaInfo text value like pymediainfo does: numbers become numbers"""
+    if not text:
+        return None
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            continue
+    return text
+
+_mediainfo_session = None
+_mediainfo_session_pid = None
+
+def get_mediainfo_session():
+    """This process' MediaInfoSession (workers get their own), None if libmediainfo isn't loadable"""
+    global _mediainfo_session, _mediainfo_session_pid
+    if _mediainfo_session_pid != os.getpid():
+        _mediainfo_session_pid = os.getpid()
+        try:
+            _mediainfo_session = MediaInfoSession.load()
+        except Exception:
+            _mediainfo_session = None
+    return _mediainfo_session
+
+def mediainfo_tracks(file_path, parameters):
+    """Tracks read through the shared session, or MediaInfo.parse() when there is none"""
+    session = get_mediainfo_session()
+    if session is not None:
+        return session.tracks(file_path, parameters)
+    return MediaInfo.parse(file_path).tracks
+
+def _extract_audio(file_path, buffer):
+    fileDict = dict.fromkeys(AUDIO_FIELDS)
+    audio = File(buffer.fileobj())
+    mode_map = {0: "Stereo", 1: "Joint stereo", 2: "Dual channel", 3: "Mono"}
+    if hasattr(audio, 'info'):
+        fileDict['Length (min)'] = round(number=float(audio.info.length/60), ndigits=2)
+        fileDict['Bitrate (kbps)'] = float(audio.info.bitrate/1000)
+        fileDict['Sample rate (Hz)'] = float(audio.info.sample_rate)
+        fileDict['Channels'] = int(audio.info.channels)
+        # Specific handling for mutagen types
+        if hasattr(audio.info, 'mode'):
+            fileDict['Mode'] = f'{mode_map.get(audio.info.mode, "Unknown")}'
+        if hasattr(audio.info, 'bits_per_sample'):
+            fileDict['Bit Depth'] = int(audio.info.bits_per_sample)
+    return fileDict
+
+def _extract_video(file_path, buffer):
+    fileDict = dict.fromkeys(VIDEO_FIELDS)
+    for track in mediainfo_tracks(file_path, {'Video': VIDEO_PARAMETERS, 'Audio': AUDIO_TRACK_PARAMETERS}):
+        width = getattr(track, "width", None)
+        height = getattr(track, "height", None)
+        par = getattr(track, "pixel_aspect_ratio", None) or 1.0
+        ratio = Fraction(1, 1)
+        if width and height:
+            decimal_ar = float(width) / float(height) * float(par)
+            ratio = Fraction(decimal_ar).limit_denominator(100)
+
+        if track.track_type == "Video":
+            if track.duration:
+                fileDict['Length (min)'] = round(number=float(track.duration / 60000), ndigits=2)
+            if track.bit_rate:
+                fileDict['Bitrate (kbps)'] = float(track.bit_rate/1000)
+            if track.frame_rate:
+                fileDict['Framerate'] = float(track.frame_rate)
+            fileDict['Resolution'] = f'{track.width}x{track.height}'
+            fileDict['Aspect Ratio'] = f"{ratio.numerator}:{ratio.denominator}"
+            fileDict['Codec'] = track.format
+        elif track.track_type == "Audio":
+            fileDict['Audio Codec'] = track.format
+            fileDict['Channels'] = track.channel_s
+    return fileDict
+
+def _extract_image_header(file_path, buffer):
+    # Cheap path: read the dimensions straight from the file header
+    header = probe_image_header(buffer.head, buffer.read_at)
+    return _image_header_fields(header) if header else None
+
+def _extract_image_mediainfo(file_path, buffer):
+    fileDict = dict.fromkeys(IMAGE_FIELDS)
+    for track in mediainfo_tracks(file_path, {'Image': IMAGE_PARAMETERS}):
+        if track.track_type == "Image":
+            fileDict['Resolution'] = f"{track.width}x{track.height}" if track.width and track.height else None
+            if track.width and track.height:
+                ar = Fraction(track.width / track.height).limit_denominator(100)
+                fileDict['Aspect Ratio'] = f"{ar.numerator}:{ar.denominator}"
+            fileDict['Bit Depth'] = getattr(track, "bit_depth", None)
+            fileDict['Color Space'] = getattr(track, "color_space", None)
+            fileDict['Compression'] = getattr(track, "compression_mode", None)
+    return fileDict
+
+def _extract_gps(file_path, buffer):
+    def convert_to_degrees(value):
+        try:
+            d = value[0][0] / value[0][1]
+            m = value[1][0] / value[1][1]
+            s = value[2][0] / value[2][1]
+            return d + (m / 60.0) + (s / 3600.0)
+        except Exception:
+            return None
+
+    fileDict = dict.fromkeys(GPS_FIELDS)
+    exif_dict = read_exif(buffer) or {}
+    gps = exif_dict.get("GPS", {})
+
+    gps_lat = gps.get(piexif.GPSIFD.GPSLatitude)
+    gps_lat_ref = gps.get(piexif.GPSIFD.GPSLatitudeRef)
+    gps_lon = gps.get(piexif.GPSIFD.GPSLongitude)
+    gps_lon_ref = gps.get(piexif.GPSIFD.GPSLongitudeRef)
+
+    if gps_lat and gps_lat_ref and gps_lon and gps_lon_ref:
+        lat = convert_to_degrees(gps_lat)
+        lon = convert_to_degrees(gps_lon)
+        if gps_lat_ref.decode() != "N": lat = -lat
+        if gps_lon_ref.decode() != "E": lon = -lon
+        fileDict['GPS Latitude'] = lat
+        fileDict['GPS Longitude'] = lon
+    return fileDict
+
+def _extract_content_type(file_path, buffer):
+    return {'Content Type': sniff_content_type(buffer.peek(SNIFF_BYTES), os.path.splitext(file_path)[1])}
+
+def _extract_pdf(file_path, buffer):
+    reader = PdfReader(buffer.fileobj())
+    meta = reader.metadata
+    return {'Pages': len(reader.pages),
+            'Title': (meta.title or None) if meta else None,
+            'Author': (meta.author or None) if meta else None}
+
+OFFICE_NAMESPACES = {
+    'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'dc': 'http://purl.org/dc/elements/1.1/'
+}
+
+def _extract_office(file_path, buffer):
+    with zipfile.ZipFile(buffer.fileobj()) as zf:
+        if 'docProps/core.xml' not in zf.namelist():
+            return dict.fromkeys(OFFICE_FIELDS)
+        root = ElementTree.fromstring(zf.read('docProps/core.xml'))
+    return {'Title': root.findtext('dc:title', namespaces=OFFICE_NAMESPACES) or None,
+            'Author': root.findtext('dc:creator', namespaces=OFFICE_NAMESPACES) or None}
+
+# Starting costs are rough guesses, measurements take over after a few files
+register_extractor(Extractor('mutagen', _extract_audio, AUDIO_FORMATS, AUDIO_FIELDS, cost=0.002))
+register_extractor(Extractor('mediainfo-video', _extract_video, VIDEO_FORMATS, VIDEO_FIELDS, cost=0.05))
+register_extractor(Extractor('image-header', _extract_image_header, ['.png', '.jpg', '.jpeg', '.webp', '.gif'],
+                             IMAGE_FIELDS, cost=0.0002, magic=(b'\x89PNG', b'GIF8', b'\xff\xd8', b'RIFF')))
+register_extractor(Extractor('mediainfo-image', _extract_image_mediainfo, IMAGE_FORMATS, IMAGE_FIELDS, cost=0.03))
+register_extractor(Extractor('piexif', _extract_gps, ['.png', '.jpg', '.jpeg', '.webp'], GPS_FIELDS, cost=0.0005))
+register_extractor(Extractor('pypdf', _extract_pdf, PDF_FORMATS, PDF_FIELDS, cost=0.01, magic=(b'%PDF',)))
+register_extractor(Extractor('office', _extract_office, OFFICE_FORMATS, OFFICE_FIELDS, cost=0.003,
+                             magic=(b'PK\x03\x04',)))
+# Reads every file, so full extractions skip it, it runs where a column or criterion needs Content Type
+register_extractor(Extractor('content-type', _extract_content_type, None, CONTENT_FIELDS, cost=0.00002,
+                             on_request=True))
+
+#region Metadata cache
+
+METADATA_CACHE_ENABLED = True
+# Upper bound of cached files, least recently used entries are evicted above it
+METADATA_CACHE_MAX_ENTRIES = 1_000_000
+
+_metadata_cache = None
+
+class MetadataCache:
+    """
+    Persistent SQLite cache of extracted file metadata.
+
+    An entry is looked up by (st_dev, st_ino) and is only valid while st_size and
+    st_mtime_ns are unchanged, so re-opening a folder costs one stat per file.
+    Files whose parsers failed are remembered too and are not parsed again.
+    Every entry also lists which extractors already ran, so a lazily planned
+    scan can add the missing fields later without redoing the others.
+    Stats without an inode (DirEntry stats on Windows) are never cached.
+    """
+    SCHEMA_VERSION = 4                  #   4: extractors are named after the registry
+    LOOKUP_BATCH = 500
+    FLUSH_BATCH = 1000
+    LAST_USED_STALE = 24 * 3600         #   A hit only rewrites last_used when it is older than this
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or get_config_path('metadata_cache.db')
+        self.max_entries = max_entries or METADATA_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._pending = []
+        self._rows = None               #   Upper bound of the row count, counted when it passes max_entries
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+            self._conn.execute('DROP TABLE IF EXISTS metadata')
+            self._conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+                fields TEXT, failed INTEGER, extractors TEXT, last_used INTEGER,
+                PRIMARY KEY (dev, ino)
+            ) WITHOUT ROWID""")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used)')
+        self._conn.commit()
+
+    def get_many(self, stats_list):
+        """
+        Looks up a list of os.stat results (None entries are skipped).
+        Returns {index: (fields, failed, extractors)} for every valid hit.
+        Hardlinks of one file share its entry, every one of their indexes gets the hit.
+        """
+        by_key = {}                     #   (st_dev, st_ino) -> indexes
+        for index, stats in enumerate(stats_list):
+            if stats is not None and stats.st_ino:
+                by_key.setdefault((stats.st_dev, stats.st_ino), []).append(index)
+        by_dev = {}
+        for dev, ino in by_key:
+            by_dev.setdefault(dev, []).append(ino)
+
+        hits = {}
+        used = []                       #   Hits whose last_used is stale, eviction order only needs it roughly
+        now = int(time.time())
+        with self._lock:
+            for dev, inodes in by_dev.items():
+                for i in range(0, len(inodes), self.LOOKUP_BATCH):
+                    batch = inodes[i:i + self.LOOKUP_BATCH]
+                    marks = ','.join('?' * len(batch))
+                    rows = self._conn.execute(
+                        f'SELECT ino, size, mtime_ns, fields, failed, extractors, last_used FROM metadata '
+                        f'WHERE dev=? AND ino IN ({marks})', (dev, *batch)).fetchall()
+
+                    for ino, size, mtime_ns, fields, failed, extractors, last_used in rows:
+                        indexes = by_key[(dev, ino)]
+                        stats = stats_list[indexes[0]]
+                        if stats.st_size == size and stats.st_mtime_ns == mtime_ns:
+                            for index in indexes:
+                                hits[index] = (json.loads(fields), bool(failed), set(filter(None, extractors.split(','))))
+                            if now - last_used > self.LAST_USED_STALE:
+                                used.append((now, dev, ino))
+            if used:
+                self._conn.executemany('UPDATE metadata SET last_used=? WHERE dev=? AND ino=?', used)
+                self._conn.commit()
+        return hits
+
+    def put(self, stats, fields, failed, extractors):
+        """Queues an entry, written on flush() (or automatically every FLUSH_BATCH entries)"""
+        if not stats.st_ino:
+            return                      #   Every such file would share one (0, 0) entry
+        entry = (stats.st_dev, stats.st_ino, stats.st_size, stats.st_mtime_ns,
+                 json.dumps(fields, default=str), int(failed), ','.join(sorted(extractors)), int(time.time()))
+        with self._lock:                #   flush() swaps the list from another thread
+            self._pending.append(entry)
+            full = len(self._pending) >= self.FLUSH_BATCH
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes queued entries and evicts the oldest ones if the cache is over its size"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                self._conn.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)', pending)
+                self._evict(len(pending))
+                self._conn.commit()
+
+    def _evict(self, added):
+        # Replaced entries are counted as added too, the table is only counted once the bound passes the limit
+        if self._rows is not None:
+            self._rows += added
+            if self._rows <= self.max_entries:
+                return
+        count = self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        if count > self.max_entries:
+            # Drop a bit more than needed so eviction does not run on every flush
+            extra = count - int(self.max_entries * 0.9)
+            self._conn.execute("""
+                DELETE FROM metadata WHERE (dev, ino) IN
+                (SELECT dev, ino FROM metadata ORDER BY last_used LIMIT ?)""", (extra,))
+            count -= extra
+        self._rows = count
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+            self._rows = 0
+            self._conn.execute('DELETE FROM metadata')
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+def get_metadata_cache():
+    """Returns the shared metadata cache, or None if it is disabled or unavailable"""
+    global _metadata_cache
+    if _metadata_cache is None and METADATA_CACHE_ENABLED:
+        try:
+            _metadata_cache = MetadataCache()
+        except Exception as e:
+            logging.error(f"Metadata cache unavailable: {e}")
+            return None
+    return _metadata_cache
+
+#region I/O scheduling
+
+# Worker processes on a spinning disk, more readers only make its head seek between files
+EXTRACTION_WORKERS_ROTATIONAL = 1
+# Bytes of the next file read ahead while the current one is parsed
+PREFETCH_BYTES = 64 * 1024
+
+_rotational_devices = {}
+
+def is_rotational(st_dev):
+    """
+    True if the block device holding st_dev is a spinning disk, read from
+    /sys/block/<disk>/queue/rotational. False where that is unknown (not Linux,
+    network and virtual filesystems).
+    """
+    rotational = _rotational_devices.get(st_dev)
+    if rotational is None:
+        rotational = False
+        try:
+            # /sys/dev/block/<major>:<minor> links to the disk or partition, partitions keep queue/ in the disk
+            device = os.path.realpath(f'/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}')
+            for folder in (device, os.path.dirname(device)):
+                flag = os.path.join(folder, 'queue', 'rotational')
+                if os.path.exists(flag):
+                    with open(flag) as f:
+                        rotational = f.read().strip() == '1'
+                    break
+        except (OSError, AttributeError, ValueError):
+            pass
+        _rotational_devices[st_dev] = rotational
+    return rotational
+
+def schedule_reads(items, stats_of=lambda item: item[2]):
+    """
+    Sorts pending reads by (device, inode). Inode numbers follow the on-disk layout
+    closely enough that a disk reads them with short seeks instead of in listing order.
+    Files without an inode (DirEntry stats on Windows) keep their order.
+    """
+    return sorted(items, key=lambda item: (stats_of(item).st_dev, stats_of(item).st_ino))
+
+def extraction_workers(stats_list, workers=None):
+    """Worker count for reading these files, dropped to EXTRACTION_WORKERS_ROTATIONAL on spinning disks"""
+    if workers:
+        return workers
+    if any(is_rotational(dev) for dev in {stats.st_dev for stats in stats_list}):
+        return min(EXTRACTION_WORKERS, EXTRACTION_WORKERS_ROTATIONAL)
+    return EXTRACTION_WORKERS
+
+def prefetch_file(path, size=PREFETCH_BYTES):
+    """Asks the kernel to start reading the head of a file in the background (POSIX only)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _prefetching(items, path_of=lambda item: item[1]):
+    """Yields items, prefetching the file of the next one while the caller works on the current one"""
+    items = list(items)
+    for position, item in enumerate(items):
+        if position + 1 < len(items):
+            prefetch_file(path_of(items[position + 1]))
+        yield item
+
+#region Parallel metadata extraction
+
+# Number of worker processes used for metadata extraction (all cores by default)
+EXTRACTION_WORKERS = os.cpu_count() or 1
+# Paths sent to a worker at once, keeps inter-process traffic low on big folders
+EXTRACTION_CHUNKSIZE = 64
+# Seconds one file may take before its worker is killed and the file is skipped
+EXTRACTION_TIMEOUT = 20
+# Address space a worker may add to what it starts with (imported libraries, malloc arenas),
+# in bytes. A runaway parser fails instead of swapping
+EXTRACTION_MEMORY_LIMIT = 2 * 1024 ** 3
+# Value put in the media fields of a file whose worker hung or died
+METADATA_UNAVAILABLE = 'metadata unavailable'
+# "failed" of a file that timed out: a busy machine may be the cause, so it is not cached
+_TIMED_OUT = 'timed out'
+
+def _extract_files_chunk(items):
+    """
+    Worker side: extracts info for a chunk of (index, path, stats, fields), keeps their order.
+    Results are (index, fileDict, failed, timings), timings feed the parent's cost model.
+    """
+    results = []
+    for index, path, stats, fields in _prefetching(items):
+        timings = {}
+        fileDict, failed = _extract_file_info(path, stats, fields, timings)
+        results.append((index, fileDict, failed, timings))
+    return results
+
+def _address_space_size():
+    """Virtual memory size of this process in bytes (VmSize), raises OSError without /proc"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+
+def _extraction_worker(conn, memory_limit):
+    """Worker process main loop: extracts every chunk it gets and sends back one result per file"""
+    if resource is not None and memory_limit:
+        try:
+            limit = _address_space_size() + memory_limit
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        except (ValueError, OSError):
+            pass                                #   No /proc or the limit can't be set, run uncapped
+    while True:
+        try:
+            chunk = conn.recv()
+        except EOFError:
+            break
+        if chunk is None:
+            break
+        for item in _prefetching(chunk):
+            conn.send(_extract_files_chunk([item])[0])
+
+class _ExtractionWorker:
+    """A supervised worker process and the chunk it is working on"""
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_extraction_worker, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.chunk = deque()                #   Items sent but not answered yet, oldest first
+        self.last_progress = 0.0
+
+    def submit(self, chunk):
+        self.chunk.extend(chunk)
+        self.last_progress = time.monotonic()
+        self.conn.send(chunk)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+def _unavailable_file_info(item, timed_out=False):
+    """Result for a file whose worker hung or died: stat fields and METADATA_UNAVAILABLE"""
+    index, path, stats, fields = item
+    fileDict = _basic_file_info(path, stats)
+    for extractor in extractors_for_extension(fileDict['Extension']):
+        if fields.intersection(extractor.fields):
+            fileDict.update(dict.fromkeys(extractor.fields, METADATA_UNAVAILABLE))
+    return index, fileDict, _TIMED_OUT if timed_out else True, {}
+
+def _extraction_context():
+    """
+    Start method of the workers. Forking the app itself would copy locks that its other
+    threads (Tk, I/O pool) hold into the child, so workers fork from a clean forkserver
+    process that has this module imported already, or are spawned where there is none.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+def _extract_supervised(items, workers, chunksize, timeout=None, memory_limit=None):
+    """
+    Yields (index, fileDict, failed, timings) for every (index, path, stats, fields)
+    item as soon as it is ready. Every worker process gets one chunk at a time. A worker
+    that makes no progress for timeout seconds, or dies (crash, memory limit), is
+    killed and replaced: the file it was on is reported as unavailable and the
+    rest of its chunk goes back to the queue.
+    """
+    timeout = timeout or EXTRACTION_TIMEOUT
+    memory_limit = EXTRACTION_MEMORY_LIMIT if memory_limit is None else memory_limit
+    context = _extraction_context()
+    pending = deque(items)
+    # Smaller chunks for small jobs, so every worker gets a share
+    chunksize = max(1, min(chunksize, -(-len(pending) // workers)))
+    idle = [_ExtractionWorker(context, memory_limit) for _ in range(min(workers, len(pending)))]
+    busy = {}
+
+    def replace(worker, timed_out=False):
+        worker.kill()
+        stuck = worker.chunk.popleft()
+        pending.extendleft(reversed(worker.chunk))
+        if pending:
+            idle.append(_ExtractionWorker(context, memory_limit))
+        return _unavailable_file_info(stuck, timed_out)
+
+    try:
+        while pending or busy:
+            while pending and idle:
+                worker = idle.pop()
+                worker.submit([pending.popleft() for _ in range(min(chunksize, len(pending)))])
+                busy[worker.conn] = worker
+
+            oldest = min(worker.last_progress for worker in busy.values())
+            for conn in wait_connections(list(busy), timeout=max(0.0, oldest + timeout - time.monotonic())):
+                worker = busy[conn]
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    del busy[conn]              #   Worker died on this file
+                    yield replace(worker)
+                    continue
+                worker.chunk.popleft()
+                worker.last_progress = time.monotonic()
+                if not worker.chunk:
+                    del busy[conn]
+                    idle.append(worker)
+                yield result
+
+            now = time.monotonic()
+            for conn, worker in list(busy.items()):
+                if now - worker.last_progress > timeout:
+                    del busy[conn]              #   Hung on this file
+                    yield replace(worker, timed_out=True)
+    finally:
+        for worker in busy.values():
+            worker.kill()
+        for worker in idle:
+            worker.stop()
+
+def _extract_in_pool(items, workers, chunksize, ordered):
+    """Yields (index, fileDict, failed, timings) for every (index, path, stats, fields) item"""
+    if not items:
+        return
+    results = _extract_supervised(items, workers, chunksize)
+    try:
+        if not ordered:
+            yield from results
+            return
+        # Hold back results that overtook an earlier file
+        ready = {}
+        order = iter(sorted(item[0] for item in items))
+        next_index = next(order)
+        for result in results:
+            ready[result[0]] = result
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index = next(order, None)
+    finally:
+        # Closed early (scan cancelled): the workers are stopped right away
+        results.close()
+
+def iter_files_info(file_paths, workers=None, ordered=True, chunksize=None, cache=None, fields=None,
+                    include_stats=False):
+    """
+    Yields get_file_info() dicts for every path using a pool of worker processes.
+    Files found unchanged in the metadata cache are not parsed again, the others
+    are read in inode order (see schedule_reads). A file that
+    hangs or crashes its worker gets METADATA_UNAVAILABLE in its media fields.
+    file_paths may also hold FileRecords from scan_folder(), their stat is reused.
+
+    workers:    number of processes (defaults to EXTRACTION_WORKERS, or to
+                EXTRACTION_WORKERS_ROTATIONAL for files on a spinning disk)
+    ordered:    if True dicts come in the same order as file_paths,
+                otherwise they are streamed as soon as they are ready
+    chunksize:  paths per task (defaults to EXTRACTION_CHUNKSIZE)
+    cache:      MetadataCache to use (defaults to the shared one)
+    fields:     media fields to extract (see plan_fields_for_groups), None means all but the
+                on-request ones (Content Type).
+                The registry picks the cheapest extractors that give them, fields of
+                extractors that didn't run are left out of the dicts.
+    include_stats: yield (fileDict, stat result) pairs instead of bare dicts
+    """
+    files = list(file_paths or [])
+    chunksize = max(1, chunksize or EXTRACTION_CHUNKSIZE)
+    requested = None if fields is None else set(fields)
+    if cache is None:
+        cache = get_metadata_cache()
+
+    file_paths = []
+    stats_list = []
+    for item in files:
+        if isinstance(item, FileRecord):
+            file_paths.append(item.path)
+            stats_list.append(item.stat)
+            continue
+        file_paths.append(item)
+        try:
+            stats_list.append(os.stat(item))
+        except OSError:
+            stats_list.append(None)             #   File vanished, skip it
+
+    # Work out which fields every file still needs, nothing for plain files
+    needed = {}
+    for index, (path, stats) in enumerate(zip(file_paths, stats_list)):
+        if stats is not None:
+            extension = os.path.splitext(path)[1]
+            if requested is None:
+                wanted = set(default_fields_for_extension(extension))
+            else:
+                wanted = requested.intersection(media_fields_for_extension(extension))
+            if wanted:
+                needed[index] = wanted
+
+    cached = cache.get_many([stats_list[i] if i in needed else None for i in range(len(stats_list))]) if cache and needed else {}
+    pending = []
+    for index, wanted in needed.items():
+        missing = wanted.difference(cached[index][0]) if index in cached else wanted
+        if missing:
+            pending.append((index, file_paths[index], stats_list[index], missing))
+        else:
+            needed[index] = None                #   Fully served by the cache
+    # Read in disk order, with fewer readers on spinning disks
+    pending = schedule_reads(pending)
+    workers = max(1, extraction_workers([item[2] for item in pending], workers))
+    extracted = _extract_in_pool(pending, workers, chunksize, ordered)
+
+    def from_cache(index):
+        fileDict = _basic_file_info(file_paths[index], stats_list[index])
+        if index in cached:
+            fileDict.update(cached[index][0])
+        return fileDict
+
+    def store(index, fileDict, failed, timings):
+        observe_costs(timings)
+        if index in cached:
+            # Merge with the fields that earlier extractors already cached
+            old_fields, old_failed, old_extractors = cached[index]
+            fileDict = {**from_cache(index), **fileDict}
+            failed = failed or old_failed
+        if cache and fileDict and failed != _TIMED_OUT:         #   Tried again next time
+            done = {extractor.name for extractor in extractors_done(fileDict['Extension'], fileDict)}
+            media_fields = {k: v for k, v in fileDict.items() if k not in BASIC_FIELDS}
+            cache.put(stats_list[index], media_fields, failed, done)
+        return emit(index, fileDict)
+
+    def emit(index, fileDict):
+        return (fileDict, stats_list[index]) if include_stats else fileDict
+
+    try:
+        if ordered:
+            for index, stats in enumerate(stats_list):
+                if stats is None:
+                    continue
+                if needed.get(index):
+                    yield store(*next(extracted))
+                else:
+                    yield emit(index, from_cache(index))
+        else:
+            for index, stats in enumerate(stats_list):
+                if stats is not None and not needed.get(index):
+                    yield emit(index, from_cache(index))
+            for item in extracted:
+                yield store(*item)
+    finally:
+        extracted.close()
+        if cache:
+            cache.flush()
+
+def files_missing_fields(file_dicts, fields):
+    """{path: fileDict} of the file dicts (or FileTable rows) that miss some of the given media fields"""
+    fields = set(fields)
+    todo = {}
+    for fileDict in file_dicts:
+        wanted = fields.intersection(media_fields_for_extension(fileDict.get('Extension')))
+        if any(field not in fileDict for field in wanted):
+            todo[fileDict['Path']] = fileDict
+    return todo
+
+def fill_files_info(file_dicts, fields, workers=None):
+    """
+    Extracts the given media fields for already loaded file dicts (or FileTable rows)
+    that miss them and updates them in place. Returns the number of updated files.
+    """
+    fields = set(fields)
+    todo = files_missing_fields(file_dicts, fields)
+
+    updated = 0
+    for info in iter_files_info(list(todo), workers=workers, fields=fields):
+        todo[info['Path']].update(info)
+        updated += 1
+    return updated
+
+def get_files_info(file_paths, workers=None):
+    """Returns a list of get_file_info() dicts in the same order as file_paths"""
+    return list(iter_files_info(file_paths, workers=workers, ordered=True))
+
+#region Background scan
+
+class BackgroundJob:
+    """
+    Base of the jobs the GUI runs on a background thread. The job puts tuples
+    into a queue and the GUI polls them with next_message() from a Tk timer.
+    Subclasses implement _run().
+    """
+    def __init__(self):
+        self._messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def next_message(self):
+        """Next message or None if there is nothing new yet"""
+        try:
+            return self._messages.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        raise NotImplementedError
+
+class ScanJob(BackgroundJob):
+    """
+    Loads a folder on a background thread so the GUI stays responsive.
+    Files are sent with their path and stat fields first, media fields follow
+    as the extractors finish. The GUI reads the messages with next_message():
+
+      ('files', [(fileDict, stats), ...])   new files, basic fields only
+      ('media', [fileDict, ...])            media fields of files sent before
+      ('progress', phase, done, total)      phase is 'listing' (total None) or 'metadata'
+      ('done', snapshot)                    FolderSnapshot, None if listing was cancelled
+      ('error', message)
+    """
+    BATCH = 256
+
+    def __init__(self, folder, fields, workers=None, scan_filter=None):
+        super().__init__()
+        self.folder = folder
+        self.fields = set(fields)
+        self.workers = workers
+        self.scan_filter = scan_filter
+
+    def _run(self):
+        try:
+            snapshot = self._list_files()
+            if snapshot is not None and self._media_records:
+                self._read_metadata()
+            self._messages.put(('done', snapshot))
+        except Exception as e:
+            self._messages.put(('error', str(e)))
+
+    def _list_files(self):
+        snapshot = FolderSnapshot(self.folder, self.scan_filter)
+        self._media_records = []
+        batch = []
+        found = 0
+        for record in scan_folder(self.folder, snapshot):
+            if self._cancel.is_set():
+                if batch:
+                    self._messages.put(('files', batch))    #   Files found so far stay in the table
+                return None                             #   Half listed folder, can't be refreshed later
+            batch.append((_basic_file_info(record.path, record.stat), record.stat))
+            if self.fields.intersection(media_fields_for_extension(os.path.splitext(record.name)[1])):
+                self._media_records.append(record)
+            if len(batch) >= self.BATCH:
+                found += len(batch)
+                self._messages.put(('files', batch))
+                self._messages.put(('progress', 'listing', found, None))
+                batch = []
+        if batch:
+            self._messages.put(('files', batch))
+        return snapshot
+
+    def _read_metadata(self):
+        total = len(self._media_records)
+        results = iter_files_info(self._media_records, workers=self.workers, ordered=False,
+                                  fields=self.fields)
+        batch = []
+        done = 0
+        try:
+            for info in results:
+                if self._cancel.is_set():
+                    break                               #   Missing fields are filled on demand later
+                batch.append(info)
+                done += 1
+                if len(batch) >= self.BATCH:
+                    self._messages.put(('media', batch))
+                    self._messages.put(('progress', 'metadata', done, total))
+                    batch = []
+        finally:
+            results.close()
+        if batch:
+            self._messages.put(('media', batch))
+            self._messages.put(('progress', 'metadata', done, total))
+
+class RefreshJob(ScanJob):
+    """
+    Re-reads only the new and changed files of a folder loaded before (rescan_folder)
+    on a background thread. The table is only read here, the GUI applies the changes.
+    Sends ScanJob's 'files', 'media' and 'progress' messages, the new files as 'files', and:
+
+      ('progress', 'checking', None, None)  while the files are compared with the table
+      ('removed', [row, ...])               rows whose files are gone
+      ('changed', [(row, fileDict, stats), ...])  rows whose files changed, basic fields only
+      ('done', snapshot)                    the new FolderSnapshot
+      ('error', message)
+    """
+    def __init__(self, snapshot, table, fields, workers=None):
+        super().__init__(snapshot.folder, fields, workers, snapshot.scan_filter)
+        self.snapshot = snapshot
+        self.table = table
+
+    def _list_files(self):
+        self._messages.put(('progress', 'checking', None, None))
+        changes, snapshot = rescan_folder(self.snapshot, self.table)
+        if changes.removed:
+            self._messages.put(('removed', changes.removed))
+        changed = [(row, _basic_file_info(record.path, record.stat), record.stat) for row, record in changes.changed]
+        for start in range(0, len(changed), self.BATCH):
+            self._messages.put(('changed', changed[start:start + self.BATCH]))
+        added = [(_basic_file_info(record.path, record.stat), record.stat) for record in changes.added]
+        for start in range(0, len(added), self.BATCH):
+            self._messages.put(('files', added[start:start + self.BATCH]))
+        records = [record for row, record in changes.changed] + changes.added
+        self._media_records = [record for record in records
+                               if self.fields.intersection(media_fields_for_extension(os.path.splitext(record.name)[1]))]
+        return snapshot
+
+class FillJob(ScanJob):
+    """
+    Extracts media fields that were skipped at load time for files already in the
+    table, on a background thread. Sends ScanJob's 'media' and 'progress' messages, then:
+
+      ('done', finished)                    finished is False if the job was cancelled
+      ('error', message)
+    """
+    def __init__(self, paths, fields, workers=None):
+        super().__init__(None, fields, workers)
+        self._media_records = list(paths)
+
+    def _run(self):
+        try:
+            self._read_metadata()
+            self._messages.put(('done', not self._cancel.is_set()))
+        except Exception as e:
+            self._messages.put(('error', str(e)))
+
+#region Duplicate files
+
+DUPLICATE_PARTIAL_BYTES = 64 * 1024             #   Read from each end of a file by the partial hash
+DUPLICATE_READ_BYTES = 1024 * 1024              #   Block size of the full hash
+DUPLICATE_MIN_BYTES = 1                         #   Empty files are all "equal", they are never reported
+DUPLICATE_WORKERS = min(8, 2 * (os.cpu_count() or 1))  #   Hashing threads, file reads and blake2b release the GIL
+DUPLICATE_BATCH = 4096                          #   Files hashed between progress reports and cancel checks
+
+def find_duplicates(records, workers=None, cancel=None, progress=None):
+    """
+    Groups FileRecords with identical contents. Returns a list of groups, each a list
+    of FileRecords with the original (oldest modified, then by path) first.
+    Files are compared in three stages and every stage only reads the files that
+    still collide: same size, then a BLAKE2 hash of the head and tail, then a BLAKE2
+    hash of the whole file. Hardlinks of one file are hashed once and empty files
+    are skipped. progress(phase, done, total) is called with phase 'partial' or
+    'full'. Returns None if the cancel Event gets set.
+    """
+    by_size = {}
+    for record in records:
+        if record.stat.st_size >= DUPLICATE_MIN_BYTES:
+            by_size.setdefault(record.stat.st_size, []).append(record)
+
+    #   A candidate is a list of file sets, the records of one inode, that may be equal
+    candidates = []
+    for same_size in by_size.values():
+        if len(same_size) > 1:
+            file_sets = _files_by_inode(same_size)
+            if len(file_sets) > 1:
+                candidates.append(file_sets)
+    del by_size
+
+    if not workers:
+        devices = {file_sets[0][0].stat.st_dev for file_sets in candidates}
+        workers = EXTRACTION_WORKERS_ROTATIONAL if any(map(is_rotational, devices)) else DUPLICATE_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        candidates = _split_by_digest(pool, candidates, _partial_digest, 'partial', cancel, progress)
+        if candidates is None:
+            return None
+        #   The partial hash already covered small files whole
+        whole = [c for c in candidates if c[0][0].stat.st_size <= 2 * DUPLICATE_PARTIAL_BYTES]
+        large = [c for c in candidates if c[0][0].stat.st_size > 2 * DUPLICATE_PARTIAL_BYTES]
+        large = _split_by_digest(pool, large, _full_digest, 'full', cancel, progress)
+        if large is None:
+            return None
+
+    groups = []
+    for file_sets in whole + large:
+        group = sorted((record for files in file_sets for record in files),
+                       key=lambda record: (record.stat.st_mtime_ns, record.path))
+        groups.append(group[:1] + sorted(group[1:], key=lambda record: record.path))
+    groups.sort(key=lambda group: group[0].path)
+    return groups
+
+def _files_by_inode(records):
+    """Groups the records that are hardlinks of one file, DirEntry stats on Windows have no inode"""
+    by_inode = {}
+    for record in records:
+        key = (record.stat.st_dev, record.stat.st_ino) if record.stat.st_ino else record.path
+        by_inode.setdefault(key, []).append(record)
+    return list(by_inode.values())
+
+def _split_by_digest(pool, candidates, digest, phase, cancel, progress):
+    """Splits every candidate by the digest of its files, keeping parts with two or more file sets"""
+    jobs = [(index, files) for index, file_sets in enumerate(candidates) for files in file_sets]
+    jobs = schedule_reads(jobs, lambda job: job[1][0].stat)
+    parts = {}
+    for start in range(0, len(jobs), DUPLICATE_BATCH):
+        if cancel is not None and cancel.is_set():
+            return None
+        batch = jobs[start:start + DUPLICATE_BATCH]
+        for (index, files), value in zip(batch, pool.map(lambda job: _safe_digest(digest, job[1][0]), batch)):
+            if value is not None:                       #   Unreadable files can't be compared
+                parts.setdefault((index, value), []).append(files)
+        if progress is not None:
+            progress(phase, min(start + DUPLICATE_BATCH, len(jobs)), len(jobs))
+    return [file_sets for file_sets in parts.values() if len(file_sets) > 1]
+
+def _safe_digest(digest, record):
+    try:
+        return digest(record.path, record.stat.st_size)
+    except OSError:
+        return None
+
+def _partial_digest(path, size):
+    """BLAKE2 of the first and last DUPLICATE_PARTIAL_BYTES, the whole file if it is not longer"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(DUPLICATE_PARTIAL_BYTES))
+        if size > DUPLICATE_PARTIAL_BYTES:
+            f.seek(max(DUPLICATE_PARTIAL_BYTES, size - DUPLICATE_PARTIAL_BYTES))
+            digest.update(f.read(DUPLICATE_PARTIAL_BYTES))
+    return digest.digest()
+
+def _full_digest(path, size):
+    """BLAKE2 of the whole file, streamed through one reused buffer"""
+    digest = hashlib.blake2b()
+    buffer = bytearray(DUPLICATE_READ_BYTES)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.digest()
+
+def duplicate_roles(groups):
+    """Path -> True for the copies and False for the original of every duplicate group"""
+    roles = {}
+    for group in groups or []:
+        roles[group[0].path] = False
+        for record in group[1:]:
+            roles[record.path] = True
+    return roles
+
+def duplicate_savings(groups):
+    """
+    (copies, bytes) that dedupe_files() would get rid of in find_duplicates() groups.
+    Hardlinks of the original are not copies, and the data of a copy only counts once,
+    and only if all its hardlinks are copies (otherwise another link keeps it).
+    """
+    copies = freed = 0
+    for group in groups:
+        original = group[0].stat
+        for files in _files_by_inode(group[1:]):
+            stats = files[0].stat
+            if stats.st_ino and (stats.st_dev, stats.st_ino) == (original.st_dev, original.st_ino):
+                continue
+            copies += len(files)
+            if len(files) >= stats.st_nlink:
+                freed += stats.st_size
+    return copies, freed
+
+def dedupe_files(groups, action='hardlink', cancel=None, progress=None):
+    """
+    Gets rid of the copies in find_duplicates() groups and keeps the originals.
+    action 'hardlink' replaces every copy with a hardlink to its original, 'trash'
+    sends the copies to the trash. Files changed since they were compared are
+    skipped. Returns a list of {'path', 'ok', 'msg', 'size'} dicts, one per copy,
+    size is the number of bytes freed. A cancel Event stops before the next copy,
+    progress(done, total) is called as copies are handled.
+    """
+    if action not in ('hardlink', 'trash'):
+        raise ValueError(f'Unknown dedupe action: {action}')
+    if action == 'trash' and not send2trash:
+        raise RuntimeError('send2trash is not installed, copies can not be moved to the trash')
+
+    total = sum(len(group) - 1 for group in groups)
+    result = []
+    for group in groups:
+        original = group[0]
+        for copy in group[1:]:
+            if cancel is not None and cancel.is_set():
+                return result
+            try:
+                ok, msg, freed = _dedupe_copy(original, copy, action)
+            except OSError as e:
+                ok, msg, freed = False, f'Error: {e}', 0
+            result.append({'path': copy.path, 'ok': ok, 'msg': msg, 'size': freed})
+            if progress is not None and len(result) % MOVE_PROGRESS_EVERY == 0:
+                progress(len(result), total)
+    return result
+
+def _dedupe_copy(original, copy, action):
+    original_now = os.stat(original.path)
+    copy_now = os.stat(copy.path, follow_symlinks=False)
+    for record, now in ((original, original_now), (copy, copy_now)):
+        if (now.st_size, now.st_mtime_ns) != (record.stat.st_size, record.stat.st_mtime_ns):
+            return False, f'{record.path} changed since it was compared', 0
+    if os.path.samestat(original_now, copy_now):
+        return True, 'Already a hardlink of the original', 0
+    freed = copy_now.st_size if copy_now.st_nlink == 1 else 0  #   Other hardlinks keep the data
+
+    if action == 'hardlink':
+        if original_now.st_dev != copy_now.st_dev:
+            return False, 'The original is on another drive, can not hardlink', 0
+        temp_path = f'{copy.path}.{os.getpid()}.dedupe'
+        os.link(original.path, temp_path)
+        try:
+            os.replace(temp_path, copy.path)            #   The copy is never missing, even if this fails
+        except OSError:
+            os.remove(temp_path)
+            raise
+        return True, f'Hardlinked to {original.path}', freed
+
+    (send2trash.send2trash if IS_WINDOWS else send2trash)(copy.path)
+    return True, 'Moved to trash', freed
+
+class DuplicateJob(BackgroundJob):
+    """
+    Finds the duplicate files of a folder on a background thread. Messages:
+
+      ('progress', phase, done, total)   phase is 'listing' (total None), 'partial' or 'full'
+      ('done', groups)                   find_duplicates() groups, None if cancelled
+      ('error', message)
+    """
+    def __init__(self, folder, workers=None, scan_filter=None):
+        super().__init__()
+        self.folder = folder
+        self.workers = workers
+        self.scan_filter = scan_filter
+
+    def _run(self):
+        try:
+            records = []
+            for record in scan_folder(self.folder, scan_filter=self.scan_filter):
+                if self._cancel.is_set():
+                    self._messages.put(('done', None))
+                    return
+                records.append(record)
+                if len(records) % ScanJob.BATCH == 0:
+                    self._messages.put(('progress', 'listing', len(records), None))
+            groups = find_duplicates(records, self.workers, self._cancel,
+                                     lambda *state: self._messages.put(('progress',) + state))
+            self._messages.put(('done', groups))
+        except Exception as e:
+            self._messages.put(('error', str(e)))
+
+class DedupeJob(BackgroundJob):
+    """
+    Runs dedupe_files() on a background thread. Messages:
+
+      ('progress', 'dedupe', done, total)   copies handled so far
+      ('done', result)                      dedupe_files() result, only the copies it got to if cancelled
+      ('error', message)
+    """
+    def __init__(self, groups, action):
+        super().__init__()
+        self.groups = groups
+        self.action = action
+
+    def _run(self):
+        try:
+            result = dedupe_files(self.groups, self.action, self._cancel,
+                                  lambda done, total: self._messages.put(('progress', 'dedupe', done, total)))
+            self._messages.put(('done', result))
+        except Exception as e:
+            self._messages.put(('error', str(e)))
+
+#region File table
+
+_MISSING = object()
+
+class FileTable:
+    """
+    Column storage for the files loaded in the Sorting page, replacing a list of dicts.
+
+    Sizes and timestamps live in typed arrays, directories and extensions are stored
+    once and referenced by id. Media fields get a column only once some file has a
+    value for them, holding ids into that column's distinct values. Indexing or iterating gives FileRow views that read like the
+    old per-file dicts, in the current view order. How many rows in the view hold each
+    distinct extension and media value is counted as rows come and go, for dropdowns.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._names = []                        #   Full name of every row
+        self._dir_ids = array('I')
+        self._dirs = []
+        self._dir_index = {}
+        self._ext_ids = array('I')
+        self._exts = []
+        self._ext_index = {}
+        self._size = array('q')
+        self._created = array('q')              #   Timestamps in nanoseconds
+        self._modified = array('q')
+        self._accessed = array('q')
+        self._ino = array('Q')
+        self._done = array('I')                 #   Extractor.bit of the extractors that ran
+        self._done_any = 0
+        self._media = {}                        #   field -> array of value ids per row, 0 is None
+        self._media_values = {}                 #   field -> [None, distinct values...]
+        self._media_index = {}                  #   field -> {(type, value): value id}
+        self._order = array('I')                #   Rows in view order
+        self._alive = bytearray()               #   1 while a row is in the view
+        self._counts = {}                       #   'Extension' or media field -> rows per value id
+        self._sort_cache = {}                   #   field -> rows in ascending order, until data changes
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        return (FileRow(self, row) for row in self._order)
+
+    def __getitem__(self, index):
+        return FileRow(self, self._order[index])
+
+    def row_ids(self):
+        """Row ids in view order, the live array (sort() and remove() replace it with a new one)"""
+        return self._order
+
+    def row(self, row):
+        """FileRow of a row id (as returned by append), not a view position"""
+        return FileRow(self, row)
+
+    def append(self, fileDict, stats):
+        """Adds a get_file_info() dict and the stat it was built from, returns the row id"""
+        row = len(self._names)
+        directory, name = os.path.split(fileDict['Path'])
+        self._names.append(name)
+        self._alive.append(1)
+        self._dir_ids.append(self._intern(self._dirs, self._dir_index, directory))
+        self._ext_ids.append(self._intern(self._exts, self._ext_index, os.path.splitext(name)[1]))
+        self._count('Extension', self._ext_ids[row], 1)
+        self._size.append(stats.st_size)
+        self._created.append(created_time_ns(stats))
+        self._modified.append(stats.st_mtime_ns)
+        self._accessed.append(stats.st_atime_ns)
+        self._ino.append(stats.st_ino)
+        self._done.append(0)
+        self.update_row(row, fileDict)
+        self._order.append(row)
+        return row
+
+    def replace_row(self, row, fileDict, stats):
+        """Replaces a row's stat and media fields after its file changed"""
+        self._set_stats(row, stats)
+        for field, column in self._media.items():
+            if row < len(column):
+                self._set_value_id(field, column, row, 0)
+        self._done[row] = 0
+        self.update_row(row, fileDict)
+
+    def remove(self, rows):
+        """Drops rows from the view, their storage is reclaimed by the next clear()"""
+        rows = set(rows)
+        if rows:
+            self._order = array('I', (row for row in self._order if row not in rows))
+            self._sort_cache.clear()
+            for row in rows:
+                if self._alive[row]:
+                    self._count('Extension', self._ext_ids[row], -1)
+                    for field, column in self._media.items():
+                        if row < len(column) and column[row]:
+                            self._count(field, column[row], -1)
+                    self._alive[row] = 0
+
+    def stat_changed(self, row, stats):
+        #   An inode of 0 (DirEntry stats on Windows) says nothing, only a real one is compared
+        inode_changed = self._ino[row] and stats.st_ino and self._ino[row] != stats.st_ino
+        return bool(inode_changed or self._size[row] != stats.st_size
+                    or self._modified[row] != stats.st_mtime_ns)
+
+    def rows_by_directory(self):
+        """{directory: {full name: row}} of all rows in the view"""
+        directories = {}
+        for row in self._order:
+            directory = self._dirs[self._dir_ids[row]]
+            names = directories.get(directory)
+            if names is None:
+                names = directories[directory] = {}
+            names[self._names[row]] = row
+        return directories
+
+    def _set_stats(self, row, stats):
+        self._size[row] = stats.st_size
+        self._created[row] = created_time_ns(stats)
+        self._modified[row] = stats.st_mtime_ns
+        self._accessed[row] = stats.st_atime_ns
+        self._ino[row] = stats.st_ino
+
+    def update_row(self, row, fileDict):
+        """Stores the media fields of fileDict and marks the extractors that produced them"""
+        self._sort_cache.clear()
+        for field, value in fileDict.items():
+            if field in BASIC_FIELDS:
+                continue
+            column = self._media.get(field)
+            if column is None:
+                if value is None:
+                    continue
+                column = self._media[field] = array('I')
+                self._media_values[field] = [None]
+                self._media_index[field] = {}
+            if len(column) <= row:              #   Columns grow lazily up to the newest row
+                column.frombytes(bytes(column.itemsize * (len(self._names) - len(column))))
+            self._set_value_id(field, column, row, self._media_value_id(field, value))
+        for extractor in extractors_done(self._exts[self._ext_ids[row]], fileDict):
+            self._done[row] |= extractor.bit
+            self._done_any |= extractor.bit
+
+    def sort(self, key, reverse=False):
+        """Reorders the view like list.sort(), key gets a FileRow"""
+        rows = sorted(self._order, key=lambda row: key(FileRow(self, row)), reverse=reverse)
+        self._order = array('I', rows)
+
+    def sort_by(self, field, reverse=False):
+        """
+        Reorders the view by one column using typed keys: sizes, dates and numbers
+        compare as numbers, text ignores case and empty values go last. The ascending
+        order of a column is kept until the data changes, so sorting by it again or
+        flipping the direction only copies an array.
+        """
+        order = self._sort_cache.get(field)
+        if order is None:
+            if field == 'Path':                 #   Two stable passes are faster than tuple keys
+                rows = sorted(self._order, key=self._sort_key('Full Name'))
+                rows.sort(key=self._sort_key('Directory'))
+            else:
+                rows = sorted(self._order, key=self._sort_key(field))
+            order = self._sort_cache[field] = array('I', rows)
+        self._order = order[::-1] if reverse else order[:]
+
+    def _sort_key(self, field):
+        """Function of a row id giving its sort key for a field"""
+        stats = {'Size': self._size, 'Created': self._created, 'Modified': self._modified, 'Accessed': self._accessed}
+        if field in stats:
+            return stats[field].__getitem__
+        names = self._names
+        if field == 'Full Name':
+            return lambda row: names[row].casefold()
+        if field == 'Name':
+            return lambda row: os.path.splitext(names[row])[0].casefold()
+        if field in ('Extension', 'Directory'):
+            values, ids = (self._exts, self._ext_ids) if field == 'Extension' else (self._dirs, self._dir_ids)
+            ranks = self._value_ranks(values)
+            return lambda row: ranks[ids[row]]
+
+        column = self._media.get(field)
+        if column is None:
+            return lambda row: 0                #   Nobody has this field, keep the order
+        if len(column) < len(names):
+            column.frombytes(bytes(column.itemsize * (len(names) - len(column))))
+        ranks = self._value_ranks(self._media_values[field])
+        return lambda row: ranks[column[row]]
+
+    @staticmethod
+    def _value_ranks(values):
+        """Position of every distinct value in typed order, ranking is done once per value, not per row"""
+        def typed(value):
+            if value is None:
+                return (2, 0)
+            if isinstance(value, (int, float)):
+                return (0, value)
+            return (1, str(value).casefold())
+        ranks = [0] * len(values)
+        for rank, value_id in enumerate(sorted(range(len(values)), key=lambda i: typed(values[i]))):
+            ranks[value_id] = rank
+        return ranks
+
+    def value_counts(self, field):
+        """
+        [(value, rows)] for every distinct value of 'Extension' or a media field among
+        the rows in the view, empty values left out. Kept up to date by append, update_row
+        and remove, so it costs one step per distinct value, not per row.
+        """
+        counts = self._counts.get(field)
+        if counts is None:
+            return []
+        values = self._exts if field == 'Extension' else self._media_values[field]
+        return [(values[value_id], count) for value_id, count in enumerate(counts)
+                if count and values[value_id] is not None]
+
+    def _set_value_id(self, field, column, row, value_id):
+        old = column[row]
+        if old != value_id:
+            column[row] = value_id
+            if self._alive[row]:
+                if old:
+                    self._count(field, old, -1)
+                if value_id:
+                    self._count(field, value_id, 1)
+
+    def _count(self, field, value_id, delta):
+        counts = self._counts.get(field)
+        if counts is None:
+            counts = self._counts[field] = array('I')
+        if len(counts) <= value_id:
+            counts.frombytes(bytes(counts.itemsize * (value_id + 1 - len(counts))))
+        counts[value_id] += delta
+
+    def fields(self, row):
+        """Fields a row has, including media fields that were extracted as empty"""
+        return self._fields_of(self._done[row])
+
+    def columns(self):
+        """Union of the fields of all rows"""
+        return self._fields_of(self._done_any)
+
+    @staticmethod
+    def _fields_of(done):
+        fields = list(BASIC_FIELDS)
+        for extractor in EXTRACTORS.values():
+            if done & extractor.bit:
+                fields.extend(field for field in extractor.fields if field not in fields)
+        return fields
+
+    def extensions(self):
+        """Distinct extensions of the loaded files"""
+        return list(self._exts)
+
+    def value(self, row, field, default=None):
+        """Raw value of one field of a row, the same as get_file_info() gives"""
+        if field == 'Path':
+            return os.path.join(self._dirs[self._dir_ids[row]], self._names[row])
+        if field == 'Full Name':
+            return self._names[row]
+        if field == 'Name':
+            return os.path.splitext(self._names[row])[0]
+        if field == 'Extension':
+            return self._exts[self._ext_ids[row]]
+        if field == 'Directory':
+            return self._dirs[self._dir_ids[row]]
+        if field == 'Size':
+            return self._size[row]
+        if field == 'Created':
+            return self._created[row]
+        if field == 'Modified':
+            return self._modified[row]
+        if field == 'Accessed':
+            return self._accessed[row]
+
+        column = self._media.get(field)
+        if column is not None and row < len(column) and column[row]:
+            return self._media_values[field][column[row]]
+        if self._has_media_field(row, field):
+            return None
+        return default
+
+    def has_field(self, row, field):
+        return field in BASIC_FIELDS or self._has_media_field(row, field)
+
+    def _has_media_field(self, row, field):
+        done = self._done[row]
+        return any(done & extractor.bit and field in extractor.fields for extractor in EXTRACTORS.values())
+
+    def _media_value_id(self, field, value):
+        if value is None:
+            return 0
+        #   1, 1.0 and True hash alike but are shown differently, and NaN never equals itself
+        key = (type(value), value) if value == value else (type(value), 'nan')
+        index = self._media_index[field]
+        value_id = index.get(key)
+        if value_id is None:
+            values = self._media_values[field]
+            value_id = index[key] = len(values)
+            values.append(value)
+        return value_id
+
+    @staticmethod
+    def _intern(values, index, value):
+        value_id = index.get(value)
+        if value_id is None:
+            value_id = index[value] = len(values)
+            values.append(value)
+        return value_id
+
+class FileRow:
+    """Read-only dict-like view of one FileTable row, update() writes media fields back"""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def get(self, field, default=None):
+        return self.table.value(self.row, field, default)
+
+    def __getitem__(self, field):
+        value = self.table.value(self.row, field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return self.table.has_field(self.row, field)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self.table.fields(self.row)
+
+    def items(self):
+        return [(field, self.get(field)) for field in self.keys()]
+
+    def update(self, fileDict):
+        self.table.update_row(self.row, fileDict)
+
 #region system security:
 
 def is_drive_root(path):
@@ -238,117 +2588,722 @@ def is_system_path_prohibited(path):
             
     return False
 
+#region Moving files
+
+MOVE_WORKERS = 4                                #   Threads copying files to other filesystems
+MOVE_PER_DEVICE = 2                             #   Copies reading or writing one device at a time (1 on HDDs)
+MOVE_PROGRESS_EVERY = 256                       #   Files moved between progress reports
+
+# One move done by MoveExecutor. size is the bytes copied, 0 for a rename.
+# method is 'rename' (same filesystem), 'copy', 'skip' (destination taken) or 'in place' (already there)
+MoveResult = namedtuple('MoveResult', ['src', 'dst', 'ok', 'msg', 'size', 'method'])
+
+class MoveExecutor:
+    """
+    Moves many files into destination folders.
+
+    A file going to a folder on its own filesystem is moved with one os.rename, no data
+    is copied, so those are done right away. Moves to another filesystem copy the data
+    and go to a pool of workers, with at most per_device copies touching one device
+    (1 on spinning disks). conflict is what happens when the destination name is taken:
+    'rename' adds _1, _2... before the extension, 'skip' leaves the file where it is.
+
+    run() returns a MoveResult per move in the given order, summary holds the totals
+    and throughput of the last run. A cancelled run leaves the files it didn't get to
+    where they are and out of the results.
+    """
+    def __init__(self, workers=MOVE_WORKERS, per_device=MOVE_PER_DEVICE, conflict='rename'):
+        self.workers = workers
+        self.per_device = per_device
+        self.conflict = conflict
+        self.summary = {}
+
+    def run(self, moves, cancel=None, progress=None):
+        """
+        moves is an iterable of (file path, destination folder). cancel is an Event that
+        stops the run before the next file, progress(done, total) is called as files move.
+        """
+        started = time.perf_counter()
+        moves = list(moves)
+        results = [None] * len(moves)
+        folders = {}                            #   Destination folder -> its st_dev
+        taken = set()                           #   Destination paths given out in this run
+        copies = []
+        for position, (src, folder) in enumerate(moves):
+            if cancel is not None and cancel.is_set():
+                break
+            if progress is not None and position % MOVE_PROGRESS_EVERY == 0:
+                progress(position - len(copies), len(moves))
+            dst = None
+            try:
+                if not folder:
+                    raise OSError("No destination folder")
+                dst_dev = folders.get(folder)
+                if dst_dev is None:
+                    os.makedirs(folder, exist_ok=True)
+                    dst_dev = folders[folder] = os.stat(folder).st_dev
+                src_stat = os.lstat(src)
+                dst = self._destination(src, folder, taken)
+                if dst is None:
+                    results[position] = MoveResult(src, None, False, "File exists", 0, 'skip')
+                    continue
+                if dst == src:
+                    results[position] = MoveResult(src, src, True, None, 0, 'in place')
+                    continue
+                if src_stat.st_dev == dst_dev:
+                    try:
+                        os.rename(src, dst)
+                        results[position] = MoveResult(src, dst, True, None, 0, 'rename')
+                        continue
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:  #   Same device seen through two mounts still can't be renamed
+                            raise
+                copies.append((position, src, dst, src_stat, dst_dev))
+            except OSError as e:
+                results[position] = MoveResult(src, dst, False, str(e), 0, 'rename')
+        if copies:
+            self._copy(copies, results, cancel, progress)
+        results = [result for result in results if result is not None]
+        self.summary = self._summarize(results, time.perf_counter() - started)
+        return results
+
+    def _destination(self, src, folder, taken):
+        """Free path for src in folder, src itself if it is already there, None to skip it"""
+        name = os.path.basename(src)
+        path = os.path.join(folder, name)
+        if os.path.abspath(path) == os.path.abspath(src):
+            return src
+        if path in taken or os.path.lexists(path):
+            if self.conflict == 'skip':
+                return None
+            base, extension = os.path.splitext(name)
+            counter = 1
+            while path in taken or os.path.lexists(path):
+                path = os.path.join(folder, f"{base}_{counter}{extension}")
+                counter += 1
+        taken.add(path)
+        return path
+
+    def _copy(self, copies, results, cancel=None, progress=None):
+        """Moves across filesystems on the worker pool, limited per device"""
+        limits = {}
+        for position, src, dst, src_stat, dst_dev in copies:
+            for device in (src_stat.st_dev, dst_dev):
+                if device not in limits:
+                    limits[device] = threading.Semaphore(1 if is_rotational(device) else self.per_device)
+
+        def copy(src, dst, src_stat, dst_dev):
+            if cancel is not None and cancel.is_set():
+                return None                     #   Not started yet, stays where it is
+            devices = sorted({src_stat.st_dev, dst_dev})   #   Same order everywhere, no deadlocks
+            for device in devices:
+                limits[device].acquire()
+            try:
+                shutil.move(src, dst)
+                return MoveResult(src, dst, True, None, src_stat.st_size, 'copy')
+            except (OSError, shutil.Error) as e:
+                return MoveResult(src, dst, False, str(e), 0, 'copy')
+            finally:
+                for device in reversed(devices):
+                    limits[device].release()
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            futures = [(position, pool.submit(copy, src, dst, src_stat, dst_dev))
+                       for position, src, dst, src_stat, dst_dev in copies]
+            done = len(results) - len(copies)   #   Renames and failures are already finished
+            for position, future in futures:
+                results[position] = future.result()
+                done += 1
+                if progress is not None and done % MOVE_PROGRESS_EVERY == 0:
+                    progress(done, len(results))
+
+    @staticmethod
+    def _summarize(results, seconds):
+        moved = [result for result in results if result.ok]
+        copied = sum(result.size for result in moved)
+        return {
+            'files': len(results),
+            'moved': len(moved),
+            'failed': len(results) - len(moved),
+            'renamed': sum(1 for result in moved if result.method == 'rename'),
+            'copied': sum(1 for result in moved if result.method == 'copy'),
+            'bytes': copied,
+            'seconds': seconds,
+            'files_per_second': len(moved) / seconds if seconds > 0 else 0.0,
+            'bytes_per_second': copied / seconds if seconds > 0 else 0.0,
+        }
+
 #region Moving by criteria
 
-def StartSorting(folder_structure, source_folder, groups, fileDicts):
-    absolute_file_paths = []
-    for dirpath, dirnames, filenames in os.walk(source_folder):
-        for filename in filenames:
-            full_path = os.path.join(dirpath, filename)
-            absolute_file_paths.append(full_path)
+def StartSorting(folder_structure, source_folder, groups, fileDicts, scan_filter=None, cancel=None, progress=None):
+    """
+    Moves the files of source_folder into the destinations of the first group they match.
+    fileDicts are the loaded metadata rows (a FileTable or plain dicts), cancel an Event
+    and progress(phase, done, total) gets phase 'listing' (total None), 'partial' and
+    'full' while duplicates are compared, then 'moving'. Returns the MoveResults,
+    None if cancelled before anything was moved.
+    """
+    file_records = []
+    for record in scan_folder(source_folder, scan_filter=scan_filter):
+        if cancel is not None and cancel.is_set():
+            return None
+        file_records.append(record)
+        if progress is not None and len(file_records) % ScanJob.BATCH == 0:
+            progress('listing', len(file_records), None)
 
     file_metadata_map = {d.get('Path'): d for d in fileDicts if d.get('Path')}
 
-    def moveFiles(file_path):
+    Folder_create_function(folder_structure) 
+
+    #   Contents are only compared when a group asks for duplicates
+    duplicates = {}
+    if any(c.get('field') == 'Duplicate' for group in groups for c in criteria_leaves(group['criteria'])):
+        groups_found = find_duplicates(file_records, cancel=cancel, progress=progress)
+        if groups_found is None:
+            return None
+        duplicates = duplicate_roles(groups_found)
+
+    moves = route_files(file_records, groups, file_metadata_map, duplicates)
+    if cancel is not None and cancel.is_set():
+        return None
+    executor = MoveExecutor()
+    results = executor.run(moves, cancel, progress and (lambda done, total: progress('moving', done, total)))
+    logging.info(f"[Sort] {executor.summary}")
+    return results
+
+class SortJob(BackgroundJob):
+    """
+    Runs StartSorting() on a background thread. The metadata the groups need is
+    copied out of fileDicts here, on the caller's thread, so the table may change
+    while the job runs. Messages:
+
+      ('progress', phase, done, total)   see StartSorting()
+      ('done', results)                  MoveResults, None if cancelled before moving
+      ('error', message)
+    """
+    def __init__(self, folder_structure, source_folder, groups, fileDicts, scan_filter=None):
+        super().__init__()
+        self.folder_structure = folder_structure
+        self.source_folder = source_folder
+        self.groups = groups
+        self.scan_filter = scan_filter
+        fields = {c.get('field') for group in groups for c in criteria_leaves(group['criteria'])}
+        fields.difference_update(BASIC_FIELDS)
+        self.file_dicts = [{'Path': d.get('Path'), **{field: d.get(field) for field in fields}}
+                           for d in fileDicts] if fields else []
+
+    def _run(self):
         try:
-            shutil.move(src=file_path, dst=f'{destination_folder}/{os.path.basename(file_path)}')
+            results = StartSorting(self.folder_structure, self.source_folder, self.groups, self.file_dicts,
+                                   self.scan_filter, self._cancel,
+                                   lambda *state: self._messages.put(('progress',) + state))
+            self._messages.put(('done', results))
         except Exception as e:
-            pass
+            self._messages.put(('error', str(e)))
 
-    Folder_create_function(folder_structure) 
-    
+def route_files(file_records, groups, file_metadata_map=None, duplicates=None):
+    """
+    Decides where every file goes: groups are tried in order and the first one whose
+    criteria match takes the file, later groups never see it. Only Content Type
+    criteria read from disk, sniffing files whose row has no 'Content Type' yet
+    (callers extract it first with ensure_fields to avoid that). A group's candidates
+    come from FileIndex lookups when its criteria allow it (extension, size and date
+    ranges), otherwise every file not yet routed.
+    Returns [(path, destination folder)] in file order, unmatched files are left out.
+    """
+    file_metadata_map = file_metadata_map or {}
+    if numpy is not None and len(file_records) >= VECTORIZE_MIN_FILES:
+        return _route_files_vectorized(file_records, groups, file_metadata_map, duplicates)
+    index = FileIndex(file_records)
+    route = [None] * len(file_records)          #   Destination of every file, by position
     for group in groups:
         destination_folder = group['destination']
-        criteria = group['criteria']
+        # Criteria become one predicate per group before any file is looked at
+        matches = compile_criteria(group['criteria'], duplicates)
+        candidates = index.candidates(group['criteria'])
+        if candidates is None:
+            candidates = range(len(file_records))
+        elif index.exact(group['criteria']):
+            for position in candidates:         #   The index already answered the only criterion
+                if route[position] is None:
+                    route[position] = destination_folder
+            continue
+        for position in candidates:
+            if route[position] is None:
+                record = file_records[position]
+                if matches(record, file_metadata_map.get(record.path)):
+                    route[position] = destination_folder
+    return [(record.path, destination_folder) for record, destination_folder in zip(file_records, route)
+            if destination_folder is not None]
+
+def _lower_extension(name):
+    """os.path.splitext(name)[1].lower() of a bare file name, without splitext's overhead"""
+    dot = name.rfind('.')
+    return name[dot:].lower() if dot > 0 and name[:dot].lstrip('.') else ''
+
+class FileIndex:
+    """
+    Indexes over scanned FileRecords for route_files(): positions by lowercase extension
+    and positions ordered by size and by each timestamp, searched with bisect. Each one
+    is built the first time a criterion needs it.
 
-        for file in absolute_file_paths:
-            if not os.path.exists(file):
-                continue
-            file_data = file_metadata_map.get(file)
-            matches_all_criteria = True
-
-            for criterion in criteria:
-                field = criterion['field']
-                operator = criterion['operator']
-                value = criterion['value']
-
-                is_criterion_met = False
-
-                if field == 'Extension':
-                    file_extension = os.path.splitext(file)[1]
-                    if operator == 'equals':
-                        if file_extension.lower() == value.lower():
-                            is_criterion_met = True
-
-                elif field == 'Name':
-                    filename = os.path.basename(file)
-                    if operator == 'equals':
-                        if filename == value: is_criterion_met = True
-                    elif operator == 'contains':
-                        if value in filename: is_criterion_met = True
-                            
-                elif field == 'Size':
-                    unit_multipliers = {'B': 1,'KB': 1024,'MB': 1024 * 1024,'GB': 1024 * 1024 * 1024}
-                    if isinstance(value, list) and len(value) == 2:
-                        try:
-                            size_value = float(value[0])
-                            unit = value[1].upper()
-                            stats = os.stat(file)
-                            sizeBytes = stats.st_size
-                            multiplier = unit_multipliers.get(unit, 1)
-                            required_bytes = size_value * multiplier
-                            if operator == 'greater than':
-                                if sizeBytes > required_bytes: is_criterion_met = True
-                            elif operator == 'less than':
-                                if sizeBytes < required_bytes: is_criterion_met = True   
-                        except (ValueError, FileNotFoundError, AttributeError):
-                            pass
-                            
-                elif field in ['Color Space', 'Resolution', 'Aspect Ratio', 'Codec', 'Audio Codec', 'Compression', 'Mode']:
-                    if file_data is not None:
-                        actual_value = file_data.get(field)
-                        if actual_value is not None and operator == 'equals':
-                            if actual_value == value: is_criterion_met = True
-
-                elif field in ['GPS Latitude', 'GPS Longitude', 'Sample rate (Hz)', 'Bitrate (kbps)', 'Framerate', 'Length (min)', 'Channels', 'Bit Depth']:
-                    if file_data is not None:
-                        actual_value = file_data.get(field)
-                        if actual_value is not None and (operator in ['less than', 'greater than','equals']):
-                            try:
-                                actual_float = float(actual_value)
-                                required_float = float(value)
-                                if operator == 'less than' and actual_float < required_float:
-                                    is_criterion_met = True
-                                elif operator == 'greater than' and actual_float > required_float:
-                                    is_criterion_met = True
-                                elif operator == 'equals' and actual_float == required_float:
-                                    is_criterion_met = True
-                            except (ValueError, TypeError):
-                                is_criterion_met = False
-                elif field in ['Created', 'Modified', 'Accessed']:
-                    if file_data is not None:
-                        actual_date_str = file_data.get(field)
-                        if actual_date_str is not None and isinstance(value, list) and len(value) == 3:
-                            if operator in ['less than', 'greater than', 'equals']:
-                                try:
-                                    actual_date = datetime.strptime(actual_date_str.split(' ')[0], '%d-%m-%Y').date()
-                                    criterion_date_str = f"{value[0]}-{value[1]}-{value[2]}"
-                                    required_date = datetime.strptime(criterion_date_str, '%d-%m-%Y').date()
-                                    if operator == 'less than' and actual_date < required_date:
-                                        is_criterion_met = True
-                                    elif operator == 'greater than' and actual_date > required_date:
-                                        is_criterion_met = True
-                                    elif operator == 'equals' and actual_date == required_date:
-                                        is_criterion_met = True
-                                except (ValueError, TypeError):
-                                    is_criterion_met = False
-
-                if not is_criterion_met:
-                    matches_all_criteria = False
-                    break
-                
-            if matches_all_criteria:
-                moveFiles(file)
+    candidates() gives the positions that can match a criteria list, a superset that
+    the compiled predicate still checks, so only criteria the indexes understand narrow it.
+    """
+    STAT_KEYS = {
+        'Size': lambda stats: stats.st_size,
+        'Created': created_time_ns,
+        'Modified': lambda stats: stats.st_mtime_ns,
+        'Accessed': lambda stats: stats.st_atime_ns,
+    }
+
+    def __init__(self, file_records):
+        self.file_records = file_records
+        self._extensions = None                 #   lowercase extension -> [positions]
+        self._sorted = {}                       #   field -> (values ascending, positions in that order)
+
+    def extension(self, extension):
+        if self._extensions is None:
+            self._extensions = {}
+            for position, record in enumerate(self.file_records):
+                key = _lower_extension(record.name)
+                positions = self._extensions.get(key)
+                if positions is None:
+                    positions = self._extensions[key] = array('I')
+                positions.append(position)
+        return self._extensions.get(extension, ())
+
+    def between(self, field, low, high, include_low=True):
+        """Positions whose field value is in [low, high), or (low, high) with include_low False"""
+        column = self._sorted.get(field)
+        if column is None:
+            key = self.STAT_KEYS[field]
+            keys = [key(record.stat) for record in self.file_records]
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            column = self._sorted[field] = (array('q', [keys[i] for i in order]), array('I', order))
+        values, positions = column
+        start = bisect.bisect_left(values, low) if include_low else bisect.bisect_right(values, low)
+        return positions[start:max(start, bisect.bisect_left(values, high))]
+
+    def candidates(self, criteria):
+        """Positions that may match all of criteria, the smallest set any of them allows, None for all"""
+        best = None
+        for node in criteria or []:
+            found = self._node_candidates(node)
+            if found is not None and (best is None or len(found) < len(best)):
+                best = found
+        return best
+
+    @staticmethod
+    def exact(criteria):
+        """True if the candidates() of criteria are exactly the files it matches"""
+        if len(criteria) != 1 or 'field' not in criteria[0]:
+            return False
+        field, operator = criteria[0].get('field'), criteria[0].get('operator')
+        if field == 'Extension':
+            return operator == 'equals'
+        if field == 'Size':
+            return operator in ('greater than', 'less than')
+        return field in DATE_FIELDS and operator in ('greater than', 'less than', 'equals')
+
+    def _node_candidates(self, node):
+        if 'all' in node:
+            return self.candidates(node['all'])
+        if 'any' in node:
+            parts = [self._node_candidates(child) for child in node['any']]
+            if any(part is None for part in parts):
+                return None
+            return parts[0] if len(parts) == 1 else sorted(set().union(*parts))
+        if 'not' in node:
+            return None
+        return self._criterion_candidates(node)
+
+    def _criterion_candidates(self, criterion):
+        field, operator = criterion.get('field'), criterion.get('operator')
+        if field == 'Extension' and operator == 'equals':
+            return self.extension(str(criterion.get('value')).lower())
+        if field == 'Size' or field in DATE_FIELDS:
+            target = _criterion_target(criterion)
+            if target is None:
+                return None
+            if field == 'Size':
+                if operator == 'greater than':
+                    return self.between(field, target, float('inf'), include_low=False)
+                if operator == 'less than':
+                    return self.between(field, float('-inf'), target)
+                return None
+            day_start, day_end = target
+            if operator == 'less than':
+                return self.between(field, float('-inf'), day_start)
+            if operator == 'greater than':
+                return self.between(field, day_end, float('inf'))
+            if operator == 'equals':
+                return self.between(field, day_start, day_end)
+        return None
+
+# Folders with at least this many files are routed with NumPy masks when it is installed
+VECTORIZE_MIN_FILES = 20_000
+
+def _route_files_vectorized(file_records, groups, file_metadata_map, duplicates=None):
+    """
+    route_files() with every group turned into a boolean mask over FileColumns, first
+    match wins by masking out files earlier groups took. Criteria the columns can't
+    express (names, content types) run the compiled predicate on the files the rest
+    of the mask leaves. Gives the same result as the scalar path.
+    """
+    columns = FileColumns(file_records, file_metadata_map, duplicates)
+    route = numpy.full(len(file_records), -1, dtype=numpy.int32)    #   Group number of every file
+    for number, group in enumerate(groups):
+        mask, exact = columns.mask(group['criteria'])
+        free = route < 0
+        mask = free if mask is None else mask & free
+        if exact:
+            route[mask] = number
+            continue
+        matches = compile_criteria(group['criteria'], duplicates)
+        for position in numpy.flatnonzero(mask).tolist():
+            record = file_records[position]
+            if matches(record, file_metadata_map.get(record.path)):
+                route[position] = number
+    return [(file_records[position].path, groups[route[position]]['destination'])
+            for position in numpy.flatnonzero(route >= 0).tolist()]
+
+class FileColumns:
+    """
+    NumPy columns of scanned FileRecords and their metadata for _route_files_vectorized():
+    int64 sizes and nanosecond timestamps, float64 numeric fields (NaN where missing),
+    and int32 codes for extensions and text fields. Built the first time a criterion
+    needs them.
+    """
+    def __init__(self, file_records, file_metadata_map, duplicates=None):
+        self.file_records = file_records
+        self.file_metadata_map = file_metadata_map
+        self.duplicates = duplicates or {}
+        self._columns = {}
+
+    def mask(self, criteria):
+        """
+        (mask, exact) of a criteria list: mask holds every file that can match (None for
+        all of them) and exact tells if it holds only those, so no predicate is needed.
+        """
+        mask, exact = None, True
+        for node in criteria or []:
+            node_mask, node_exact = self._node_mask(node)
+            exact = exact and node_exact
+            if node_mask is not None:
+                mask = node_mask if mask is None else mask & node_mask
+        return mask, exact
+
+    def _node_mask(self, node):
+        if 'all' in node:
+            return self.mask(node['all'])
+        if 'any' in node:
+            parts = [self._node_mask(child) for child in node['any']]
+            if any(part_mask is None for part_mask, part_exact in parts):
+                return None, False
+            mask = numpy.zeros(len(self.file_records), dtype=bool)
+            for part_mask, part_exact in parts:
+                mask |= part_mask
+            return mask, all(part_exact for part_mask, part_exact in parts)
+        if 'not' in node:
+            inner, exact = self._node_mask(node['not'])
+            if inner is None or not exact:
+                return None, False
+            return ~inner, True
+        mask = self._criterion_mask(node)
+        return mask, mask is not None
+
+    def _criterion_mask(self, criterion):
+        """Exact mask of one field criterion, None if it has to be checked file by file"""
+        field, operator, value = criterion.get('field'), criterion.get('operator'), criterion.get('value')
+        target = _criterion_target(criterion)
+        nothing = numpy.zeros(len(self.file_records), dtype=bool)
+
+        if field == 'Extension':
+            if operator != 'equals':
+                return nothing
+            codes, index = self._codes(field, self._extension_values)
+            code = index.get(str(value).lower())
+            return nothing if code is None else codes == code
+
+        if field == 'Name' or field == 'Content Type':
+            return None
+
+        if field == 'Size':
+            if target is None or operator not in ('greater than', 'less than'):
+                return nothing
+            sizes = self._stat_column(field)
+            return sizes > target if operator == 'greater than' else sizes < target
+
+        if field in EQUALITY_FIELDS:
+            if operator != 'equals':
+                return nothing
+            codes, index = self._codes(field, lambda: self._field_values(field))
+            code = index.get(value)
+            return nothing if code is None else codes == code
+
+        if field in NUMERIC_FIELDS:
+            if target is None or operator not in ('greater than', 'less than', 'equals'):
+                return nothing
+            numbers = self._numeric_column(field)
+            if operator == 'greater than':
+                return numbers > target
+            if operator == 'less than':
+                return numbers < target
+            return numbers == target
+
+        if field == 'Duplicate':
+            roles = self._duplicate_roles()
+            if operator == 'is duplicate':
+                return (roles == 2) == target
+            if operator == 'in duplicate group':
+                return (roles > 0) == target
+            return nothing
+
+        if field in DATE_FIELDS:
+            if target is None:
+                return nothing
+            day_start, day_end = target         #   Compared as int64, float bounds would round nanoseconds
+            stamps = self._stat_column(field)
+            if operator == 'less than':
+                return stamps < day_start
+            if operator == 'greater than':
+                return stamps >= day_end
+            if operator == 'equals':
+                return (stamps >= day_start) & (stamps < day_end)
+            return nothing
+
+        return nothing
+
+    def _stat_column(self, field):
+        column = self._columns.get(field)
+        if column is None:
+            key = FileIndex.STAT_KEYS[field]
+            column = self._columns[field] = numpy.fromiter(
+                (key(record.stat) for record in self.file_records), dtype=numpy.int64, count=len(self.file_records))
+        return column
+
+    def _numeric_column(self, field):
+        column = self._columns.get(field)
+        if column is None:
+            def number(value):
+                return float(value) if isinstance(value, (int, float)) else numpy.nan
+            column = self._columns[field] = numpy.fromiter(
+                (number(value) for value in self._field_values(field)), dtype=numpy.float64,
+                count=len(self.file_records))
+        return column
+
+    def _codes(self, field, values_of):
+        """(int32 code of every file, {value: code}), -1 for files without a value"""
+        column = self._columns.get(field)
+        if column is None:
+            index = {}
+            codes = numpy.fromiter(
+                (-1 if value is None else index.setdefault(value, len(index)) for value in values_of()),
+                dtype=numpy.int32, count=len(self.file_records))
+            column = self._columns[field] = (codes, index)
+        return column
+
+    def _extension_values(self):
+        return (_lower_extension(record.name) for record in self.file_records)
+
+    def _field_values(self, field):
+        for record in self.file_records:
+            file_data = self.file_metadata_map.get(record.path)
+            yield file_data.get(field) if file_data is not None else None
+
+    def _duplicate_roles(self):
+        """int8 per file: 0 not in a duplicate group, 1 the original, 2 a copy"""
+        column = self._columns.get('Duplicate')
+        if column is None:
+            duplicates = self.duplicates
+            column = self._columns['Duplicate'] = numpy.fromiter(
+                ({None: 0, False: 1, True: 2}[duplicates.get(record.path)] for record in self.file_records),
+                dtype=numpy.int8, count=len(self.file_records))
+        return column
+
+# Fields compared as they are, only with 'equals'
+EQUALITY_FIELDS = ['Color Space', 'Resolution', 'Aspect Ratio', 'Codec', 'Audio Codec', 'Compression', 'Mode',
+                   'Title', 'Author']
+
+def criteria_leaves(criteria):
+    """Yields the field criteria of a group's criteria, including those inside 'all', 'any' and 'not' nodes"""
+    for node in criteria or []:
+        if 'all' in node:
+            yield from criteria_leaves(node['all'])
+        elif 'any' in node:
+            yield from criteria_leaves(node['any'])
+        elif 'not' in node:
+            yield from criteria_leaves([node['not']])
+        else:
+            yield node
+
+def compile_criteria(criteria, duplicates=None):
+    """
+    Turns a group's criteria into one predicate(record, file_data) -> bool, where
+    record is a FileRecord and file_data its metadata row (or None).
+
+    criteria is a list that must all match. Every element is either a field criterion
+    {'field', 'operator', 'value'} or a node {'all': [...]}, {'any': [...]} or
+    {'not': element}, nested as deep as needed. Values are parsed here, so matching a
+    file is a few comparisons. duplicates is duplicate_roles() for 'Duplicate' criteria.
+    """
+    return _compile_all([_compile_node(node, duplicates or {}) for node in criteria or []])
+
+def _compile_node(node, duplicates):
+    if 'all' in node:
+        return _compile_all([_compile_node(child, duplicates) for child in node['all']])
+    if 'any' in node:
+        return _compile_any([_compile_node(child, duplicates) for child in node['any']])
+    if 'not' in node:
+        inner = _compile_node(node['not'], duplicates)
+        return lambda record, file_data: not inner(record, file_data)
+    return _compile_criterion(node, duplicates)
+
+def _compile_all(predicates):
+    if not predicates:
+        return lambda record, file_data: True
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda record, file_data: first(record, file_data) and second(record, file_data)
+    return lambda record, file_data: all(predicate(record, file_data) for predicate in predicates)
+
+def _compile_any(predicates):
+    if not predicates:
+        return _never
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda record, file_data: first(record, file_data) or second(record, file_data)
+    return lambda record, file_data: any(predicate(record, file_data) for predicate in predicates)
+
+def _never(record, file_data):
+    return False
+
+def _compare(operator, target):
+    """Function telling if a number passes operator against target, None if it can't be compared"""
+    if target is None:
+        return None
+    if operator == 'greater than':
+        return lambda actual: actual > target
+    if operator == 'less than':
+        return lambda actual: actual < target
+    if operator == 'equals':
+        return lambda actual: actual == target
+    return None
+
+def _compile_criterion(criterion, duplicates):
+    """Predicate of one field criterion, matching nothing if its operator or value make no sense"""
+    field, operator, value = criterion.get('field'), criterion.get('operator'), criterion.get('value')
+    target = _criterion_target(criterion)
+
+    if field == 'Extension':
+        if operator != 'equals':
+            return _never
+        extension = str(value).lower()
+        return lambda record, file_data: os.path.splitext(record.name)[1].lower() == extension
+
+    if field == 'Name':
+        if operator == 'equals':
+            return lambda record, file_data: record.name == value
+        if operator == 'contains':
+            return lambda record, file_data: value in record.name
+        return _never
+
+    if field == 'Size':
+        compare = _compare(operator, target) if operator != 'equals' else None
+        if compare is None:
+            return _never
+        return lambda record, file_data: compare(record.stat.st_size)
+
+    if field in EQUALITY_FIELDS:
+        if operator != 'equals':
+            return _never
+        def equal(record, file_data):
+            if file_data is None:
+                return False
+            actual = file_data.get(field)
+            return actual is not None and actual == value
+        return equal
+
+    if field in NUMERIC_FIELDS:
+        compare = _compare(operator, target)
+        if compare is None:
+            return _never
+        def numeric(record, file_data):
+            if file_data is None:
+                return False
+            actual = file_data.get(field)
+            return isinstance(actual, (int, float)) and compare(actual)
+        return numeric
+
+    if field == 'Content Type':
+        if operator not in ('equals', 'contains'):
+            return _never
+        text = str(value).lower()
+        def content(record, file_data):
+            content_type = file_data.get('Content Type') if file_data is not None else None
+            if content_type is None:
+                try:
+                    content_type = sniff_file(record.path)
+                except OSError:
+                    content_type = None
+            if operator == 'equals':
+                return content_type_matches(content_type, value)
+            return bool(content_type) and text in content_type
+        return content
+
+    if field == 'Duplicate':
+        if operator == 'is duplicate':          #   Role is True for a copy, False for the original
+            return lambda record, file_data: (duplicates.get(record.path) is True) == target
+        if operator == 'in duplicate group':
+            return lambda record, file_data: (record.path in duplicates) == target
+        return _never
+
+    if field in DATE_FIELDS:
+        if target is None:
+            return _never
+        day_start, day_end = target
+        # Every operator is a [low, high) range of nanoseconds
+        bounds = {'less than': (float('-inf'), day_start), 'greater than': (day_end, float('inf')),
+                  'equals': (day_start, day_end)}.get(operator)
+        if bounds is None:
+            return _never
+        low, high = bounds
+        if field == 'Created':
+            return lambda record, file_data: low <= created_time_ns(record.stat) < high
+        attribute = 'st_mtime_ns' if field == 'Modified' else 'st_atime_ns'
+        return lambda record, file_data: low <= getattr(record.stat, attribute) < high
+
+    return _never
+
+def _criterion_target(criterion):
+    """
+    Converts a criterion value into what StartSorting compares raw values against:
+    bytes for Size, a float for numeric fields, a (start, end) nanosecond range for
+    dates, a bool for Duplicate and None if the value can't be parsed.
+    """
+    field, value = criterion['field'], criterion['value']
+    try:
+        if field == 'Duplicate':
+            return str(value).lower() == 'yes'
+        if field == 'Size':
+            unit_multipliers = {'B': 1,'KB': 1024,'MB': 1024 * 1024,'GB': 1024 * 1024 * 1024}
+            if isinstance(value, list) and len(value) == 2:
+                return float(value[0]) * unit_multipliers.get(str(value[1]).upper(), 1)
+            return None
+        if field in DATE_FIELDS:
+            if isinstance(value, list) and len(value) == 3:
+                return day_range_ns(*value)
+            return None
+        if field in NUMERIC_FIELDS:
+            return float(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return value
 
 #region Desktop sorting
 
@@ -379,6 +3334,7 @@ class CinnamonDesktopOrganizer:
     def __init__(self):
         self.desktop_path = self.get_desktop_path()
         self.metadata_path = Path.home() / ".local/share/gvfs-metadata"
+        self.content_types = {}                 #   Path -> MIME type, filled by organize_desktop
         self.check_environment()
     
     def get_desktop_path(self):
@@ -621,6 +3577,12 @@ class CinnamonDesktopOrganizer:
                 actual_value = datetime.fromtimestamp(file_path.stat().st_ctime)
             except:
                 actual_value = None
+        elif criterion in ("content type", "content_type"):
+            actual_value = self.content_types.get(str(file_path))
+            if operator in ("equals", "=="):
+                return content_type_matches(actual_value, value)
+            if actual_value is None:
+                return False
         else:
             return False
         
@@ -657,30 +3619,17 @@ class CinnamonDesktopOrganizer:
     def move_files_to_folder(self, files, destination_path):
         """Move files to a destination folder"""
         results = []
-        dest = Path(destination_path)
-        
-        try:
-            dest.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            print(f"Error creating destination folder: {e}")
-            return [(f.name, False, str(e)) for f in files]
-        
-        for file_path in files:
-            try:
-                dest_file = dest / file_path.name
-                
-                if dest_file.exists():
-                    print(f"⚠ {file_path.name} already exists at destination")
-                    results.append((file_path.name, False, "File exists"))
-                    continue
-                
-                shutil.move(str(file_path), str(dest_file))
+        moves = MoveExecutor(conflict='skip').run((str(file_path), str(destination_path)) for file_path in files)
+        for file_path, move in zip(files, moves):
+            if move.ok:
                 print(f"✓ Moved {file_path.name} -> {destination_path}")
                 results.append((file_path.name, True, None))
-                
-            except Exception as e:
-                print(f"✗ Failed to move {file_path.name}: {e}")
-                results.append((file_path.name, False, str(e)))
+            elif move.method == 'skip':
+                print(f"⚠ {file_path.name} already exists at destination")
+                results.append((file_path.name, False, move.msg))
+            else:
+                print(f"✗ Failed to move {file_path.name}: {move.msg}")
+                results.append((file_path.name, False, move.msg))
         
         return results
     
@@ -695,6 +3644,11 @@ class CinnamonDesktopOrganizer:
         
         zones = desktop_config.get('desktop_zones', {})
         rules = desktop_config.get('desktop_rules', [])
+
+        # Content types are read once for all rules, unchanged files come from the metadata cache
+        self.content_types = {}
+        if any(rule.get("criterion", "").lower() in ("content type", "content_type") for rule in rules):
+            self.content_types = sniff_files(str(f) for f in all_files)
         
         print(f"Desktop path: {self.desktop_path}")
         print(f"Files found: {len(all_files)}")
@@ -1438,31 +4392,31 @@ def get_universal_date_obj(filepath):
     Спроба отримати дату створення файлу з різних джерел.
     Повертає об'єкт datetime.
     """
-    # 1. Спробуємо EXIF для зображень
-    try:
-        img = Image.open(filepath)
-        exif_dict = piexif.load(img.info.get('exif', b''))
-        if exif_dict and piexif.ImageIFD.DateTime in exif_dict['0th']:
-            date_bytes = exif_dict['0th'][piexif.ImageIFD.DateTime]
-            return datetime.strptime(date_bytes.decode('utf-8'), '%Y:%m:%d %H:%M:%S')
-    except Exception:
-        pass
+    # Файл відкривається один раз, всі парсери читають той самий буфер
+    with FileBuffer(filepath) as buffer:
+        # 1. Спробуємо EXIF для зображень
+        try:
+            exif_dict = read_exif(buffer)
+            if exif_dict and piexif.ImageIFD.DateTime in exif_dict['0th']:
+                date_bytes = exif_dict['0th'][piexif.ImageIFD.DateTime]
+                return datetime.strptime(date_bytes.decode('utf-8'), '%Y:%m:%d %H:%M:%S')
+        except Exception:
+            pass
 
-    # 2. Спробуємо Mutagen для медіа
-    try:
-        audio = File(filepath, easy=True)
-        if audio and 'date' in audio:
-            date_val = audio['date'][0]
-            return datetime.fromisoformat(date_val.split('T')[0])
-    except Exception:
-        pass
+        # 2. Спробуємо Mutagen для медіа
+        try:
+            audio = File(buffer.fileobj(), easy=True)
+            if audio and 'date' in audio:
+                date_val = audio['date'][0]
+                return datetime.fromisoformat(date_val.split('T')[0])
+        except Exception:
+            pass
 
-    # 3. Якщо нічого не вийшло - беремо дату модифікації файлу
-    try:
-        timestamp = os.path.getmtime(filepath)
-        return datetime.fromtimestamp(timestamp)
-    except Exception:
-        return datetime.now() # Крайній випадок
+        # 3. Якщо нічого не вийшло - беремо дату модифікації файлу
+        try:
+            return datetime.fromtimestamp(buffer.stat.st_mtime if buffer.stat else os.path.getmtime(filepath))
+        except Exception:
+            return datetime.now() # Крайній випадок
 
 def get_metadata_value_by_key(filepath, key_name):
     """
@@ -1822,28 +4776,21 @@ def rename_file_with_template(file_path, template_rules):
     except Exception as e:
         logging.error(f"[Rename] ERROR: {e}")
 
-def move_file_action(file_path, destination_folder):
-    try:
-        if not destination_folder: return False
-        if not os.path.exists(destination_folder):
-            os.makedirs(destination_folder)
-        
-        filename = os.path.basename(file_path)
-        destination_path = os.path.join(destination_folder, filename)
-        
-        if os.path.exists(destination_path):
-            base, extension = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(os.path.join(destination_folder, f"{base}_{counter}{extension}")):
-                counter += 1
-            destination_path = os.path.join(destination_folder, f"{base}_{counter}{extension}")
-
-        shutil.move(file_path, destination_path)
-        logging.info(f"[Move] SUCCESS: {file_path} -> {destination_path}")
-        return True
-    except Exception as e:
-        logging.error(f"[Move] ERROR: {e}")
-        return False
+def move_files_action(moves):
+    """
+    Moves the (file path, destination folder) pairs of one automation pass in one
+    MoveExecutor run, taken names get a _1, _2... suffix. Returns the MoveResults.
+    """
+    moves = [(file_path, destination_folder) for file_path, destination_folder in moves if destination_folder]
+    if not moves:
+        return []
+    results = MoveExecutor().run(moves)
+    for move in results:
+        if move.ok:
+            logging.info(f"[Move] SUCCESS: {move.src} -> {move.dst}")
+        else:
+            logging.error(f"[Move] ERROR: {move.src}: {move.msg}")
+    return results
 
 # --- ЛОГІКА ПОТОКУ (WORKER) ---
 
@@ -1894,9 +4841,15 @@ def process_folder_logic(target_folder, stop_event):
             continue
 
         # 3. Виконуємо роботу
+        moves = []                              #   Moved together after the pass, even if a later file fails
         try:
             if os.path.exists(target_folder):
                 files = [f for f in os.listdir(target_folder) if os.path.isfile(os.path.join(target_folder, f))]
+
+                # Sniffed once per pass and only if a rule needs it, unchanged files come from the cache
+                content_types = {}
+                if any(rule.get("criteria") == "Content Type" for rule in rules):
+                    content_types = sniff_files(os.path.join(target_folder, f) for f in files)
                 
                 for filename in files:
                     file_path = os.path.join(target_folder, filename)
@@ -1933,6 +4886,14 @@ def process_folder_logic(target_folder, stop_event):
                             elif operation == "contains" and check_val in name_only.lower():
                                 match = True
 
+                        # Content Type (MIME type or family, e.g. "image/png" or "image")
+                        elif criteria == "Content Type":
+                            content_type = content_types.get(file_path)
+                            if operation == "equals" and content_type_matches(content_type, value):
+                                match = True
+                            elif operation == "contains" and content_type and value and value.lower() in content_type:
+                                match = True
+
                         # Size (MB)
                         elif criteria == "Size (MB)":
                             try:
@@ -1950,7 +4911,7 @@ def process_folder_logic(target_folder, stop_event):
                                 logging.info(f"[Delete] {filename}")
                                 break 
                             elif action == "Move":
-                                move_file_action(file_path, details)
+                                moves.append((file_path, details))
                                 break 
                             elif action == "Rename":
                                 rename_file_with_template(file_path, details)
@@ -1960,6 +4921,11 @@ def process_folder_logic(target_folder, stop_event):
 
         except Exception as e:
             logging.error(f"Error in thread {target_folder}: {e}")
+        finally:
+            try:
+                move_files_action(moves)
+            except Exception as e:
+                logging.error(f"Error in thread {target_folder}: {e}")
 
         # Чекаємо наступного циклу
         steps = int(sleep_seconds)
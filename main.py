@@ -503,15 +503,225 @@ class FillerPage(tk.Frame):
         back_button.place(x=10, y=10)
 
 
+#region Virtual table
+class VirtualTable(ttk.Frame):
+    """
+    Table for very long lists. The Treeview only holds the rows that fit on the
+    screen, they are refilled from the data source when the view scrolls, so Tk
+    never sees more than a screenful of items however many rows there are.
+
+    set_rows(keys, values_of, tags_of) sets the content: keys are row ids in view
+    order, values_of(key) gives a row's column values and tags_of(key) its tags.
+    Columns, headings and displaycolumns are set on .tree as on any Treeview.
+    Selection is kept by key, read it with selection() and listen to
+    <<VirtualTableSelect>> instead of <<TreeviewSelect>>.
+    """
+    WHEEL_ROWS = 3
+
+    def __init__(self, parent, horizontal_scroll=True, **tree_options):
+        super().__init__(parent)
+        #   Selection is handled here, the Treeview only shows it
+        self.tree = ttk.Treeview(self, selectmode="none", **tree_options)
+        self._vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self._vsb.pack(side='right', fill='y')
+        if horizontal_scroll:
+            hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+            self.tree.configure(xscrollcommand=hsb.set)
+            hsb.pack(side='bottom', fill='x')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+        self._keys = []
+        self._values_of = lambda key: ()
+        self._tags_of = None
+        self._offset = 0                        #   View index of the top row
+        self._visible = 1                       #   Rows that fit on the screen
+        self._pool = []                         #   Treeview items, one per shown row
+        self._selected = set()
+        self._anchor = None                     #   View index of the last clicked row
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<Button-1>", self._on_click)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        for sequence in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.tree.bind(sequence, self._on_key)
+        self.tree.bind("<Control-a>", lambda e: self.select_all() or "break")
+
+    def set_rows(self, keys, values_of, tags_of=None):
+        """Shows these rows, the scroll position and the selected keys are kept"""
+        self._keys = keys
+        self._values_of = values_of
+        self._tags_of = tags_of
+        if self._anchor is not None and self._anchor >= len(keys):
+            self._anchor = None
+        self._show()
+
+    def refresh(self):
+        """Re-reads the shown rows, after their data changed"""
+        self._show()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def selection(self):
+        """Selected keys in view order"""
+        if not self._selected:
+            return []
+        return [key for key in self._keys if key in self._selected]
+
+    def is_selected(self, key):
+        return key in self._selected
+
+    def focused(self):
+        """Key of the last clicked row or None"""
+        if self._anchor is None:
+            return None
+        return self._keys[self._anchor]
+
+    def selection_set(self, keys):
+        self._selected = set(keys)
+        self._show()
+        self._notify()
+
+    def select_all(self):
+        self.selection_set(self._keys)
+
+    def clear_selection(self):
+        self._anchor = None
+        self.selection_set(())
+
+    def see(self, index):
+        """Scrolls the least needed to show the row at this view index"""
+        if index < self._offset:
+            self.scroll_to(index)
+        elif index >= self._offset + self._visible:
+            self.scroll_to(index - self._visible + 1)
+
+    def scroll_to(self, index):
+        self._offset = index
+        self._show()
+
+    def _show(self):
+        count = len(self._keys)
+        self._offset = max(0, min(self._offset, count - self._visible))
+        shown = min(self._visible, count - self._offset)
+        while len(self._pool) < shown:
+            self._pool.append(self.tree.insert("", "end"))
+        while len(self._pool) > shown:
+            self.tree.delete(self._pool.pop())
+
+        selected = []
+        for position, item in enumerate(self._pool):
+            key = self._keys[self._offset + position]
+            tags = self._tags_of(key) if self._tags_of else ()
+            self.tree.item(item, values=self._values_of(key), tags=tags)
+            if key in self._selected:
+                selected.append(item)
+        self.tree.selection_set(selected)
+        self.tree.yview_moveto(0)
+
+        if count:
+            self._vsb.set(self._offset / count, (self._offset + shown) / count)
+        else:
+            self._vsb.set(0, 1)
+
+    def _on_resize(self, event=None):
+        measured = self.tree.bbox(self._pool[0]) if self._pool else ''
+        if measured:
+            top, row_height = measured[1], measured[3]
+        else:
+            style = self.tree.cget("style") or "Treeview"
+            row_height = int(ttk.Style().lookup(style, "rowheight") or 20)
+            top = row_height                    #   Heading is about one row high
+        visible = max(1, (self.tree.winfo_height() - top) // max(1, row_height))
+        if visible != self._visible:
+            self._visible = visible
+            self._show()
+            if not measured and self._pool:
+                self.after_idle(self._on_resize)    #   Measure the real row height now that rows exist
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self._keys)))
+        elif action == "scroll":
+            step = self._visible if unit == "pages" else 1
+            self.scroll_to(self._offset + int(amount) * step)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self._offset - self.WHEEL_ROWS)
+        else:
+            self.scroll_to(self._offset + self.WHEEL_ROWS)
+        return "break"
+
+    def _on_click(self, event):
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return                              #   Headings and column resizing work as usual
+        item = self.tree.identify_row(event.y)
+        if item not in self._pool:
+            return "break"
+        index = self._offset + self._pool.index(item)
+        key = self._keys[index]
+        if event.state & 0x0001 and self._anchor is not None:      #   Shift: range from the last click
+            low, high = sorted((self._anchor, index))
+            if not event.state & 0x0004:
+                self._selected.clear()
+            self._selected.update(self._keys[low:high + 1])
+        elif event.state & 0x0004:                                  #   Control: toggle one row
+            self._selected ^= {key}
+            self._anchor = index
+        else:
+            self._selected = {key}
+            self._anchor = index
+        self.tree.focus_set()
+        self._show()
+        self._notify()
+        return "break"
+
+    def _on_key(self, event):
+        count = len(self._keys)
+        if not count:
+            return "break"
+        current = self._anchor if self._anchor is not None else -1
+        moves = {"Up": -1, "Down": 1, "Prior": -self._visible, "Next": self._visible}
+        if event.keysym == "Home":
+            index = 0
+        elif event.keysym == "End":
+            index = count - 1
+        else:
+            index = max(0, min(count - 1, current + moves[event.keysym]))
+        self._anchor = index
+        self._selected = {self._keys[index]}
+        self.see(index)
+        self._show()
+        self._notify()
+        return "break"
+
+    def _notify(self):
+        self.event_generate("<<VirtualTableSelect>>")
+
+
 #region Sorting Menu
 class SortingPage(tk.Frame):
+    SCAN_POLL_MS = 20               #   How often the background scan is read into the table
+    SCAN_POLL_BUDGET = 0.025        #   Seconds of table work per read, keeps the window responsive
+
     def __init__(self, parent, controller):
         super().__init__(parent, bg=bg_c)
         self.controller = controller
-        self.file_data = []
+        self.file_data = back.FileTable()           #   Columnar storage, shared with GroupsManager, never rebound
         self.all_columns = []
         self.source_folder_path = None
+        self.folder_snapshot = None                 #   Directory mtimes of the last scan, for Refresh
+        self.scan_job = None                        #   Background job (scan, metadata fill, duplicates, sorting) while one runs
+        self._poll_id = None                        #   Pending after() of the job's poll loop
+        self._fill_then = None                      #   Called when the running FillJob is done
+        self._field_requests = []                   #   (fields, then) waiting for the running job
+        self.scan_filter = back.ScanFilter(back.DEFAULT_EXCLUDES)   #   Folders and files the scan leaves out
+        self._scan_rows = {}
         self.first_launch = True
+        #   Every column a file can have, in the order they are shown
+        self.tree_columns = self._sorted_columns(back.all_fields())
 
         self.profiles_file = get_config_path("sorting_profiles.json")
 
@@ -524,12 +734,32 @@ class SortingPage(tk.Frame):
         folder_button = ttk.Button(top_panel, text="Folder", command=self.load_folder_data)
         folder_button.pack(side="left", padx=5, pady=5)
 
+        refresh_button = ttk.Button(top_panel, text="Refresh", command=self.refresh_folder_data)
+        refresh_button.pack(side="left", padx=5, pady=5)
+
+        duplicates_button = ttk.Button(top_panel, text="Duplicates", command=self.find_duplicates)
+        duplicates_button.pack(side="left", padx=5, pady=5)
+
+        scan_options_button = ttk.Button(top_panel, text="Scan Options", command=self.edit_scan_options)
+        scan_options_button.pack(side="left", padx=5, pady=5)
+        self.scan_options_label = tk.Label(top_panel, text="", fg="white", bg="#3C3F41")
+        self.scan_options_label.pack(side="left", padx=5)
+        self._show_scan_options()
+
         reset_button = ttk.Button(top_panel, text="Reset", command=self._reset_page)
         reset_button.pack(side="left", padx=5, pady=5)
         
         return_button = ttk.Button(top_panel, text="Return", command=lambda: controller.show_frame("StartPage"))
         return_button.pack(side="right", padx=5, pady=5)
 
+        #   Scan progress, only shown while a folder loads
+        self.scan_frame = tk.Frame(top_panel, bg="#3C3F41")
+        self.scan_label = tk.Label(self.scan_frame, text="", fg="white", bg="#3C3F41")
+        self.scan_label.pack(side="left", padx=5)
+        self.scan_progress = ttk.Progressbar(self.scan_frame, length=150, mode="indeterminate")
+        self.scan_progress.pack(side="left", padx=5)
+        ttk.Button(self.scan_frame, text="Cancel", command=self.cancel_scan).pack(side="left", padx=5)
+
         ttk.Button(top_panel, text="Save New", command=self._save_profile).pack(side="left", padx=(20, 2))
 
         self.profile_var = tk.StringVar()
@@ -565,14 +795,10 @@ class SortingPage(tk.Frame):
         right_frame.pack(side="right", fill="both", expand=True, padx=(5, 0))
 
         #   --- LEFT COLUMN ---
-        self.tree = ttk.Treeview(tree_frame, show='headings', style="Dark.Treeview")
-        #   Scrollbars              !!!!!!!!!! Make horizontal Scrollbar go faster 
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)     #   Vertical Scrollbar
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.tree.xview)   #   Horizontal Scrollbar
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        vsb.pack(side='right', fill='y')
-        hsb.pack(side='bottom', fill='x')
-        self.tree.pack(side='left', fill='both', expand=True)
+        #   Only the visible rows are in the Treeview, the rest are read from file_data when scrolled to
+        self.table = VirtualTable(tree_frame, show='headings', style="Dark.Treeview")
+        self.table.pack(side='left', fill='both', expand=True)
+        self.tree = self.table.tree
         #   Binding right click for column choosing
         self.tree.heading("#0", text="", anchor="w")            # Hidden first column
         self.tree.bind("<Button-3>", self.show_header_menu)
@@ -587,91 +813,331 @@ class SortingPage(tk.Frame):
         self.groups_manager = GroupsManager(right_frame, 
                                             folder_tree_view=self.midle_panel,
                                             file_tree=self.tree,
-                                            file_data_source=self.file_data) 
+                                            file_data_source=self.file_data,
+                                            ensure_fields=self.ensure_fields) 
         self.groups_manager.pack(fill="both", expand=True)
         start_button = ttk.Button(right_frame, text="Start Sorting", command=self.start_sorting_process, style="Red.TButton")
         start_button.pack(side="bottom", fill="x", pady=5, padx=5)
 
     #region Table
     def load_folder_data(self):
-        """Get data from folder and populate table"""
+        """Get data from folder and fill the table while it is scanned in the background"""
+        if self._other_job_running():
+            return
         folder = filedialog.askdirectory(initialdir=open_default_directory)
         if not folder:
             return                                  #   If no folder selected - stop
         elif back.is_system_path_prohibited(folder) == True:
             messagebox.showerror('Access Prohibited', 'System Folder Detected, operation terminated.')
             return
+        elif folder == self.source_folder_path and self.folder_snapshot and not self.scan_job:
+            self.refresh_folder_data()              #   Same folder again - only read what changed
+            return
 
+        self.midle_panel.set_default_output_path(folder)
+        self._scan_folder(folder)
+
+    def _scan_folder(self, folder):
+        """Start loading folder into an empty table in the background"""
+        self._stop_scan()                           #   Forget a scan that is still running, callers check for other jobs
         self.file_data.clear()                      #   Clear previous info
+        self._show_rows()
 
         self.source_folder_path = folder
-        self.midle_panel.set_default_output_path(folder)
-        
-        file_paths = back.open_folder(folder)       #   Get all files from folder
-        
-        for path in file_paths:
-            info = back.get_file_info(path)
-            if info:
-                self.file_data.append(info)         #   Get info of every file given
-        
-        self.populate_treeview()                    #   Fill Table
+        self.folder_snapshot = None
+
+        #   Only extract the metadata that shown columns and groups need, rest is filled on demand
+        fields = back.plan_fields_for_groups(self.groups_manager.get_groups(), self.tree["displaycolumns"])
+
+        self._scan_rows = {}                        #   Path -> row, to place media fields that come later
+        self.scan_job = back.ScanJob(folder, fields, scan_filter=self.scan_filter).start()
+        self._show_scan_progress('listing', 0, None)
+        self._schedule_poll(self._poll_scan)
+
+    def _poll_scan(self):
+        """Move what the background scan found into the table, a few milliseconds per call"""
+        job = self.scan_job
+        if job is None:
+            return                                  #   Scan was replaced or reset
+        deadline = time.perf_counter() + self.SCAN_POLL_BUDGET
+        while time.perf_counter() < deadline:
+            message = job.next_message()
+            if message is None:
+                break
+            kind = message[0]
+            if kind == 'files':
+                self._add_scanned_files(message[1])
+            elif kind == 'changed':
+                self._replace_scanned_files(message[1])
+            elif kind == 'removed':
+                self.file_data.remove(message[1])
+                self._show_rows()
+            elif kind == 'media':
+                self._add_scanned_media(message[1])
+            elif kind == 'progress':
+                self._show_scan_progress(*message[1:])
+            else:
+                self._finish_scan(*message)
+                return
+        self._schedule_poll(self._poll_scan)
+
+    def _add_scanned_files(self, batch):
+        for info, stats in batch:
+            self._scan_rows[info['Path']] = self.file_data.append(info, stats)
+
+        if not self.tree["columns"]:
+            self.populate_treeview()                #   First batch creates the columns
+            return
+        self._update_columns()
+        self._show_rows()
+
+    def _replace_scanned_files(self, batch):
+        for row, info, stats in batch:
+            self.file_data.replace_row(row, info, stats)
+            self._scan_rows[info['Path']] = row
+        self._update_columns()
+        self.table.refresh()
+
+    def _add_scanned_media(self, batch):
+        for info in batch:
+            row = self._scan_rows.get(info['Path'])
+            if row is None:
+                continue
+            self.file_data.row(row).update(info)
+        self._update_columns()
+        self.table.refresh()
+
+    def _finish_scan(self, kind, result):
+        self._stop_scan()
+        if kind == 'error':
+            messagebox.showerror('Scan Failed', result)
+        else:
+            self.folder_snapshot = result           #   None if listing was cancelled, then no Refresh
+        self._run_field_requests()
+
+    def cancel_scan(self):
+        """Stop the background scan, files found so far stay in the table"""
+        if self.scan_job:
+            self.scan_job.cancel()                  #   _poll_scan finishes when the job reports done
+
+    def _other_job_running(self):
+        """
+        Warns and returns True while a sort, duplicate search, dedupe or metadata extraction runs.
+        Only a folder scan is replaced without asking, the others would stop half done.
+        """
+        job = self.scan_job
+        if job is None or type(job) is back.ScanJob:
+            return False
+        what = {back.SortJob: "Sorting", back.DuplicateJob: "The duplicate search",
+                back.DedupeJob: "Deduplication"}.get(type(job), "Metadata extraction")
+        messagebox.showwarning("Warning", f"{what} is still running, wait for it or cancel it.", parent=self)
+        return True
+
+    def _schedule_poll(self, poll):
+        """Reads the running job again shortly, only one poll loop runs at a time"""
+        self._poll_id = self.after(self.SCAN_POLL_MS, poll)
+
+    def _stop_scan(self):
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)        #   The old loop must not read the next job's queue
+            self._poll_id = None
+        if self.scan_job:
+            self.scan_job.cancel()
+        self.scan_job = None
+        self._scan_rows = {}
+        self._fill_then = None
+        self.scan_frame.pack_forget()
+        self.scan_progress.stop()
+
+    def _show_scan_progress(self, phase, done, total):
+        if not self.scan_frame.winfo_ismapped():
+            self.scan_frame.pack(side="right", padx=5)
+        if phase in ('listing', 'checking'):
+            self.scan_progress.configure(mode="indeterminate")
+            self.scan_progress.start(50)
+            self.scan_label.configure(text=f"Found {done} files" if phase == 'listing' else "Checking for changes")
+        else:
+            self.scan_progress.stop()
+            self.scan_progress.configure(mode="determinate", maximum=max(total, 1), value=done)
+            labels = {'metadata': "Metadata", 'partial': "Comparing", 'full': "Hashing", 'moving': "Moving",
+                      'dedupe': "Deduplicating"}
+            self.scan_label.configure(text=f"{labels.get(phase, phase)} {done}/{total}")
+
+    def find_duplicates(self):
+        """Look for files with the same contents in the loaded folder, in the background"""
+        if not self.source_folder_path:
+            messagebox.showwarning("Warning", "Load a folder first.", parent=self)
+            return
+        if self.scan_job:
+            messagebox.showwarning("Warning", "The folder is still being scanned, wait for it or cancel it.", parent=self)
+            return
+        self.scan_job = back.DuplicateJob(self.source_folder_path, scan_filter=self.scan_filter).start()
+        self._show_scan_progress('listing', 0, None)
+        self._schedule_poll(self._poll_duplicates)
+
+    def _poll_duplicates(self):
+        job = self.scan_job
+        if job is None:
+            return
+        while True:
+            message = job.next_message()
+            if message is None:
+                self._schedule_poll(self._poll_duplicates)
+                return
+            if message[0] == 'progress':
+                self._show_scan_progress(*message[1:])
+            else:
+                break
+        self._stop_scan()
+        if message[0] == 'error':
+            messagebox.showerror('Duplicate Search Failed', message[1], parent=self)
+        elif message[1] is not None:
+            self._dedupe(message[1])
+        self._run_field_requests()
+
+    def _dedupe(self, groups):
+        """Ask what to do with the found copies and do it"""
+        #   Hardlinks of one file share their data, they are neither copies nor wasted space
+        copies, wasted = back.duplicate_savings(groups)
+        if not copies:
+            messagebox.showinfo("Duplicates", "No duplicate files found.", parent=self)
+            return
+        answer = messagebox.askyesnocancel(
+            title="Duplicates",
+            message=f"Found {copies} copies in {len(groups)} groups, {back.format_size(wasted)} in total.\n"
+                    "The oldest file of every group is kept.\n\n"
+                    "Yes - replace the copies with hardlinks\nNo - move the copies to the trash",
+            parent=self)
+        if answer is None:
+            return
+        self.scan_job = back.DedupeJob(groups, 'hardlink' if answer else 'trash').start()
+        self._show_scan_progress('dedupe', 0, sum(len(group) - 1 for group in groups))
+        self._schedule_poll(self._poll_dedupe)
+
+    def _poll_dedupe(self):
+        job = self.scan_job
+        if job is None:
+            return
+        while True:
+            message = job.next_message()
+            if message is None:
+                self._schedule_poll(self._poll_dedupe)
+                return
+            if message[0] == 'progress':
+                self._show_scan_progress(*message[1:])
+            else:
+                break
+        cancelled = job.cancelled                   #   Before _stop_scan cancels it anyway
+        self._stop_scan()
+        if message[0] == 'error':
+            messagebox.showerror("Duplicates", message[1], parent=self)
+            self._run_field_requests()
+            return
+        result = message[1]
+        failed = [item for item in result if not item['ok']]
+        freed = sum(item['size'] for item in result)
+        message = f"Freed {back.format_size(freed)}."
+        if cancelled:
+            message = f"Cancelled after {len(result)} copies. " + message
+        if failed:
+            message += f"\n{len(failed)} copies were skipped:\n" + "\n".join(
+                f"{item['path']}: {item['msg']}" for item in failed[:10])
+        messagebox.showinfo("Duplicates", message, parent=self)
+        self.refresh_folder_data()
+        self._run_field_requests()                  #   Behind the refresh if it started one
+
+    def edit_scan_options(self):
+        """Change what the scan leaves out, a loaded folder is scanned again with the new options"""
+        if self._other_job_running():
+            return
+        dialog = ScanOptionsDialog(self, self.scan_filter)
+        if dialog.result is None or dialog.result.to_dict() == self.scan_filter.to_dict():
+            return
+        rescan = not dialog.result.same_walk(self.scan_filter)
+        self.scan_filter = dialog.result
+        self._show_scan_options()
+        self.profile_combo.set("Custom")
+        self._toggle_profile_buttons(False)
+        if rescan and self.source_folder_path:
+            self._scan_folder(self.source_folder_path)
+
+    def _show_scan_options(self):
+        """Shows the exclusions in effect and whether sorting uses them too"""
+        where = "listing and sorting" if self.scan_filter.apply_to_sorting else "listing only"
+        self.scan_options_label.configure(text=f"Scan: {self.scan_filter.describe()} ({where})")
+
+    def refresh_folder_data(self):
+        """Re-read only new and changed files of the loaded folder in the background and patch the table"""
+        if not self.source_folder_path or not self.folder_snapshot or self.scan_job:
+            return
+
+        fields = back.plan_fields_for_groups(self.groups_manager.get_groups(), self.tree["displaycolumns"])
+        self._scan_rows = {}                        #   Path -> row of new and changed files, for their media fields
+        self.scan_job = back.RefreshJob(self.folder_snapshot, self.file_data, fields).start()
+        self._show_scan_progress('checking', None, None)
+        self._schedule_poll(self._poll_scan)
 
     def populate_treeview(self):
         """Dinamicly creating column and filling table"""
         previous_display_columns = list(self.tree["displaycolumns"])
 
-        self.tree.delete(*self.tree.get_children())
-
         if not self.file_data:
             self.tree["displaycolumns"] = []
             self.tree["columns"] = []
+            self._show_rows()
             return
 
-        all_keys = set()
-        for item in self.file_data:
-            all_keys.update(item.keys())
-        priority = ['Full Name', 'Name', 'Extension', 'Size', 'Path']
-        self.all_columns = sorted(list(all_keys), key=lambda x: (x not in priority, priority.index(x) if x in priority else 0))
+        self._update_columns()
 
         if not previous_display_columns:
             display_cols = ["Name", "Extension"]
         else:
             display_cols = [col for col in previous_display_columns if col in self.all_columns]
 
-        
-        self.tree["displaycolumns"] = []
+        self.tree["displaycolumns"] = display_cols
+        self._show_rows()
 
-        self.tree["columns"] = self.all_columns
+    def _show_rows(self):
+        """Point the table at file_data again, after rows were added, removed or sorted"""
+        self.table.set_rows(self.file_data.row_ids(), lambda row: self._row_values(self.file_data.row(row)))
 
-        self.tree["displaycolumns"] = display_cols
-        
+    def _update_columns(self):
+        """
+        Columns the loaded files can have go to the header menu (all_columns).
+        The Treeview itself always has every known column, so rows that bring new
+        columns don't force the whole table to be rebuilt.
+        """
+        all_keys = set(self.file_data.columns())
+        all_keys.update(back.fields_for_extensions(self.file_data.extensions()))  #   Columns that are not extracted yet
+        self.all_columns = self._sorted_columns(all_keys)
 
-        #   Creating Headings
-        for col in self.all_columns:
-            self.tree.heading(col, text=col, anchor='w', 
-                              command=lambda c=col: self.sort_column(c, False))
-            self.tree.column(col, width=150, anchor='w', stretch=False)
+        if list(self.tree["columns"]) != self.tree_columns:
+            display_cols = list(self.tree["displaycolumns"])
+            self.tree["displaycolumns"] = []
+            self.tree["columns"] = self.tree_columns
+            self.tree["displaycolumns"] = [col for col in display_cols if col in self.tree_columns]
+
+            #   Creating Headings
+            for col in self.tree_columns:
+                self.tree.heading(col, text=col, anchor='w', 
+                                  command=lambda c=col: self.sort_column(c, False))
+                self.tree.column(col, width=150, anchor='w', stretch=False)
+
+    @staticmethod
+    def _sorted_columns(columns):
+        priority = ['Full Name', 'Name', 'Extension', 'Size', 'Path']
+        return sorted(list(columns), key=lambda x: (x not in priority, priority.index(x) if x in priority else 0))
 
-        #   Fill in the data
-        for item in self.file_data:
-            values = [item.get(col, "") for col in self.all_columns]
-            self.tree.insert("", "end", values=values)
+    def _row_values(self, item):
+        return [back.format_field_value(col, item.get(col, "")) for col in self.tree_columns]
 
     def sort_column(self, col, reverse):
         """Sort data in Table by given column"""
-        #   Get data to sort
-        data_to_sort = []
-        for item in self.file_data:
-            data_to_sort.append((item.get(col, ""), item))
-
-        #   Sorting
-        data_to_sort.sort(key=lambda x: x[0], reverse=reverse)
-        
-        #   Update file_data with sorted data
-        self.file_data = [item[1] for item in data_to_sort]
+        #   Sorting reorders file_data in place, so GroupsManager keeps seeing the same table
+        self.file_data.sort_by(col, reverse=reverse)
         
-        #   Refill the table
-        self.populate_treeview()
+        #   Only the visible rows are redrawn
+        self._show_rows()
         self.tree.heading(col, command=lambda: self.sort_column(col, not reverse))
 
     def show_header_menu(self, event):
@@ -691,10 +1157,69 @@ class SortingPage(tk.Frame):
 
         menu.post(event.x_root, event.y_root)
 
+    def ensure_fields(self, fields, then=None):
+        """
+        Extract metadata fields that were skipped at load time in the background,
+        then call then(). A request made while another job runs waits for it.
+        """
+        fields = set(fields).difference(back.BASIC_FIELDS)
+        if self.scan_job:
+            self._field_requests.append((fields, then))
+            return
+        missing = back.files_missing_fields(self.file_data, fields) if fields else {}
+        if not missing:
+            if then:
+                then()
+            return
+        self._scan_rows = {path: item.row for path, item in missing.items()}
+        self._fill_then = then
+        self.scan_job = back.FillJob(list(missing), fields).start()
+        self._show_scan_progress('metadata', 0, len(missing))
+        self._schedule_poll(self._poll_fill)
+
+    def _poll_fill(self):
+        """Move the extracted fields into the table, then do what waited for them"""
+        job = self.scan_job
+        if job is None:
+            return
+        deadline = time.perf_counter() + self.SCAN_POLL_BUDGET
+        while time.perf_counter() < deadline:
+            message = job.next_message()
+            if message is None:
+                break
+            if message[0] == 'media':
+                self._add_scanned_media(message[1])
+            elif message[0] == 'progress':
+                self._show_scan_progress(*message[1:])
+            else:
+                then = self._fill_then
+                self._stop_scan()
+                if message[0] == 'error':
+                    messagebox.showerror('Metadata Failed', message[1], parent=self)
+                elif message[1] and then:
+                    then()                          #   Not when the user cancelled the extraction
+                self._run_field_requests()
+                return
+        self._schedule_poll(self._poll_fill)
+
+    def _run_field_requests(self):
+        """Start the extractions that waited for the job that just finished"""
+        requests, self._field_requests = self._field_requests, []
+        for fields, then in requests:
+            self.ensure_fields(fields, then)        #   Queued again behind the first one that starts a job
+
     def toggle_column(self, var, col_name):
         """Hide or show column"""
+        if var.get():
+            self.ensure_fields([col_name], then=lambda: self._show_column(col_name, True))  #   Fill the column before showing it
+        else:
+            self._show_column(col_name, False)
+
+    def _show_column(self, col_name, shown):
+        if col_name not in self.all_columns:
+            return                                                      #   Table was cleared meanwhile
         current_display = list(self.tree["displaycolumns"])                     #   Get what column are displayed right now
-        if var.get():                                                   #   If flag is True
+        if shown:                                                       #   If flag is True
             if col_name not in current_display:
                 insert_pos = self.all_columns.index(col_name)                   #   Insert column in it`s original position
                 current_display.insert(insert_pos, col_name)
@@ -707,13 +1232,17 @@ class SortingPage(tk.Frame):
 
     def _reset_page(self):
         """Clear all data"""
+        if self._other_job_running():
+            return
         confirm = messagebox.askyesno(
             title="Confirm Reset", 
             message="Are you sure you want to clear all loaded files, folder structures, and groups?\nThis action cannot be undone."
         )
         if confirm:
-            self.tree.delete(*self.tree.get_children())
+            self._stop_scan()
+            self._field_requests = []
             self.file_data.clear()
+            self._show_rows()
             self.tree["displaycolumns"] = []
             self.tree["columns"] = []
             self.first_launch = True
@@ -724,6 +1253,7 @@ class SortingPage(tk.Frame):
                 self.groups_manager.clear_view()
 
             self.source_folder_path = None
+            self.folder_snapshot = None
             
             messagebox.showinfo("Reset", "The sorting page has been cleared.", parent=self)
 
@@ -741,12 +1271,48 @@ class SortingPage(tk.Frame):
         if not groups:
             messagebox.showwarning("Warning", "No sorting groups created.", parent=self)
             return
+
+        if self.scan_job:
+            messagebox.showwarning("Warning", "The folder is still being scanned or sorted, wait for it or cancel it.", parent=self)
+            return
             
         print("Structure that will be given to backend:", folder_structure)
         print("Groups to process:", groups)
-        
-        #   Start sorting
-        back.StartSorting(folder_structure, self.source_folder_path, groups, self.file_data)
+
+        #   Extract metadata the criteria need but the table skipped, then sort
+        self.ensure_fields((c['field'] for group in groups for c in back.criteria_leaves(group['criteria'])),
+                           then=lambda: self._sort(folder_structure, groups))
+
+    def _sort(self, folder_structure, groups):
+        #   Start sorting in the background
+        #   Exclusions only hide files from the table unless the user asked for them when sorting too
+        scan_filter = self.scan_filter if self.scan_filter.apply_to_sorting else None
+        self.scan_job = back.SortJob(folder_structure, self.source_folder_path, groups, self.file_data, scan_filter).start()
+        self._show_scan_progress('listing', 0, None)
+        self._schedule_poll(self._poll_sorting)
+
+    def _poll_sorting(self):
+        job = self.scan_job
+        if job is None:
+            return
+        while True:
+            message = job.next_message()
+            if message is None:
+                self._schedule_poll(self._poll_sorting)
+                return
+            if message[0] == 'progress':
+                self._show_scan_progress(*message[1:])
+            else:
+                break
+        self._stop_scan()
+        if message[0] == 'error':
+            messagebox.showerror('Sorting Failed', message[1], parent=self)
+        elif message[1] is not None:
+            failed = [move for move in message[1] if not move.ok]
+            if failed:
+                messagebox.showwarning("Sorting", f"{len(failed)} files were not moved:\n" + "\n".join(
+                    f"{move.src}: {move.msg}" for move in failed[:10]), parent=self)
+        self._run_field_requests()
     
     def _toggle_profile_buttons(self, enable):
         """Turns delete profile on and off"""
@@ -815,7 +1381,8 @@ class SortingPage(tk.Frame):
         
         profile_data = {
             "folder_tree": tree_data,
-            "groups": groups_data
+            "groups": groups_data,
+            "scan": self.scan_filter.to_dict()
         }
         all_profiles[name] = profile_data
         
@@ -833,6 +1400,9 @@ class SortingPage(tk.Frame):
         
         if selected_profile == "Custom":
             return
+        if self._other_job_running():               #   Its scan options could start a new scan
+            self.profile_combo.set("Custom")
+            return
 
         confirm = messagebox.askyesno(
             "Load Profile", 
@@ -857,6 +1427,15 @@ class SortingPage(tk.Frame):
 
             self.groups_manager.groups = profile_data.get("groups", [])
             self.groups_manager._refresh_listbox()
+
+            #   Profiles saved before scan options existed keep the current ones
+            if "scan" in profile_data:
+                scan_filter = back.ScanFilter.from_dict(profile_data["scan"])
+                rescan = not scan_filter.same_walk(self.scan_filter)
+                self.scan_filter = scan_filter
+                self._show_scan_options()
+                if rescan and self.source_folder_path:
+                    self._scan_folder(self.source_folder_path)
             
             self.midle_panel.output_root_path = None
             self.midle_panel.path_label.config(text="Output Folder: Not Selected")
@@ -1081,6 +1660,72 @@ class FolderTreeView(ttk.Frame):
         self.update_view()
 
 
+#region Scan Options
+
+class ScanOptionsDialog(tk.Toplevel):
+    """
+    Pop-up window for the folders and files a scan leaves out.
+    result is the new ScanFilter, None if cancelled.
+    """
+    def __init__(self, parent, scan_filter):
+        super().__init__(parent)
+        self.transient(parent)
+        self.grab_set()
+        self.title("Scan Options")
+        self.result = None
+
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(fill="both", expand=True)
+
+        ttk.Label(main_frame, text="Exclude (one pattern per line, like .gitignore):").grid(row=0, column=0, columnspan=2, sticky="w")
+        self.excludes_text = tk.Text(main_frame, width=40, height=10, bg="#3C3F41", fg="white", insertbackground="white")
+        self.excludes_text.grid(row=1, column=0, columnspan=2, sticky="nsew", pady=(2, 8))
+        self.excludes_text.insert("1.0", "\n".join(scan_filter.excludes))
+
+        ttk.Label(main_frame, text="Max depth (empty - no limit):").grid(row=2, column=0, sticky="w")
+        self.depth_entry = ttk.Entry(main_frame, width=6)
+        self.depth_entry.grid(row=2, column=1, sticky="w")
+        if scan_filter.max_depth is not None:
+            self.depth_entry.insert(0, str(scan_filter.max_depth))
+
+        self.hidden_var = tk.BooleanVar(value=scan_filter.skip_hidden)
+        ttk.Checkbutton(main_frame, text="Skip hidden files and folders", variable=self.hidden_var).grid(row=3, column=0, columnspan=2, sticky="w", pady=2)
+        self.filesystem_var = tk.BooleanVar(value=scan_filter.one_filesystem)
+        ttk.Checkbutton(main_frame, text="Stay on the same filesystem", variable=self.filesystem_var).grid(row=4, column=0, columnspan=2, sticky="w", pady=2)
+        self.sorting_var = tk.BooleanVar(value=scan_filter.apply_to_sorting)
+        ttk.Checkbutton(main_frame, text="Also leave these files out when sorting", variable=self.sorting_var).grid(row=5, column=0, columnspan=2, sticky="w", pady=2)
+
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=6, column=0, columnspan=2, pady=(10, 0))
+        ttk.Button(btn_frame, text="Save", command=self._on_save, style="Red.TButton").pack(side="right", padx=5)
+        ttk.Button(btn_frame, text="Defaults", command=self._reset).pack(side="right", padx=5)
+        ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side="right")
+
+        self.wait_window()
+
+    def _reset(self):
+        self.excludes_text.delete("1.0", "end")
+        self.excludes_text.insert("1.0", "\n".join(back.DEFAULT_EXCLUDES))
+        self.depth_entry.delete(0, "end")
+        self.hidden_var.set(False)
+        self.filesystem_var.set(False)
+        self.sorting_var.set(False)
+
+    def _on_save(self):
+        depth = self.depth_entry.get().strip()
+        if depth and (not depth.isdigit()):
+            messagebox.showwarning("Input Error", "Max depth must be a whole number.", parent=self)
+            return
+        try:
+            self.result = back.ScanFilter(self.excludes_text.get("1.0", "end").splitlines(),
+                                          int(depth) if depth else None,
+                                          self.hidden_var.get(), self.filesystem_var.get(),
+                                          self.sorting_var.get())
+        except re.error as e:
+            messagebox.showwarning("Input Error", f"Invalid pattern: {e}", parent=self)
+            return
+        self.destroy()
+
 #region Group Editor
 
 class GroupEditorDialog(tk.Toplevel):
@@ -1088,7 +1733,7 @@ class GroupEditorDialog(tk.Toplevel):
     Pop-up window for creating and editing groups.
     Adapts UI based on available file metadata.
     """
-    def __init__(self, parent, available_folders, file_data_list=None, group_to_edit=None, root_path=None):
+    def __init__(self, parent, available_folders, file_data_list=None, group_to_edit=None, root_path=None, ensure_fields=None):
         super().__init__(parent)
         self.transient(parent)
         self.grab_set()
@@ -1098,18 +1743,22 @@ class GroupEditorDialog(tk.Toplevel):
         self.available_folders = available_folders
         self.root_path = root_path
         self.criteria_rows = []
+        self.kept_criteria = []                 #   Nested conditions the rows can't show, saved back as they are
         
         # Зберігаємо дані про файли для аналізу унікальних значень
-        # file_data_list - це список словників з метаданими
+        # file_data_list - це FileTable з метаданими (рядки читаються як словники)
         self.file_data_list = file_data_list if file_data_list else []
+        self.ensure_fields = ensure_fields      #   Extracts lazily skipped metadata on demand
+        self.value_labels = {}                  #   "value (count)" shown in dropdowns -> value
         
         # Формуємо список доступних критеріїв
         # 1. Стандартні (завжди є)
-        base_criteria = ["Extension", "Name", "Size", "Created"]
+        base_criteria = ["Extension", "Name", "Size", "Created", "Duplicate"]
         # 2. Додаємо ті, що знайшли у файлах
         found_criteria = set()
-        for item in self.file_data_list:
-            found_criteria.update(item.keys())
+        if self.file_data_list:
+            found_criteria.update(self.file_data_list.columns())
+            found_criteria.update(back.fields_for_extensions(self.file_data_list.extensions()))
         
         # Видаляємо службові поля, які не є метаданими для сортування
         ignored_fields = {'Path', 'Directory', 'Full Name'}
@@ -1134,6 +1783,14 @@ class GroupEditorDialog(tk.Toplevel):
 
         #   --- Criteria redactor ---
         ttk.Label(main_frame, text="Criteria:", font=("Sans Serif", 10, "bold")).grid(row=2, column=0, sticky="w", pady=(10, 5))
+        match_frame = ttk.Frame(main_frame)
+        match_frame.grid(row=2, column=1, columnspan=2, sticky="e", pady=(10, 5))
+        ttk.Label(match_frame, text="Match:").pack(side="left")
+        self.match_combo = ttk.Combobox(match_frame, values=["all", "any"], width=5, state="readonly")
+        self.match_combo.set("all")
+        self.match_combo.pack(side="left", padx=2)
+        self.kept_label = ttk.Label(match_frame, text="")
+        self.kept_label.pack(side="left", padx=5)
         self.criteria_frame = ttk.Frame(main_frame)
         self.criteria_frame.grid(row=3, column=0, columnspan=3, sticky="ew")
         ttk.Button(main_frame, text="+ Add Criterion", command=lambda: self._add_criterion_row()).grid(row=4, column=0, columnspan=3, pady=5)
@@ -1157,18 +1814,58 @@ class GroupEditorDialog(tk.Toplevel):
             self.dest_combo.set(path)
 
     def _get_unique_values_for_field(self, field_name):
-        """Повертає список унікальних значень для певної колонки з завантажених файлів."""
-        values = set()
-        for item in self.file_data_list:
-            val = item.get(field_name)
-            if val is not None:
-                values.add(str(val))
-        return sorted(list(values))
+        """
+        Повертає список унікальних значень колонки як "значення (кількість файлів)".
+        Лічильники FileTable ведуться під час сканування, тому файли тут не перебираються.
+        """
+        if not self.file_data_list:
+            return []
+        counts = {}
+        for val, count in self.file_data_list.value_counts(field_name):
+            text = str(back.format_field_value(field_name, val))
+            counts[text] = counts.get(text, 0) + count
+        labels = []
+        for text in sorted(counts):
+            label = f"{text} ({counts[text]})"
+            self.value_labels[label] = text
+            labels.append(label)
+        return labels
+
+    def _show_values_later(self, row_struct, field_name, extra=()):
+        """
+        Has the field extracted in the background where the scan skipped it,
+        then puts its values into the row's dropdown
+        """
+        if not self.ensure_fields:
+            return
+        widget = row_struct['val_widgets'][0]
+
+        def show_values():
+            if not widget.winfo_exists() or not row_struct['val_widgets'] or row_struct['val_widgets'][0] is not widget:
+                return                          #   Row was removed or changed meanwhile
+            values = list(extra) + self._get_unique_values_for_field(field_name)
+            if not values:
+                return
+            if isinstance(widget, ttk.Combobox):
+                widget['values'] = values
+                return
+            # Поле без значень було текстовим, тепер показуємо дропдаун з уже введеним текстом
+            combo = ttk.Combobox(widget.master, width=15, values=values)
+            combo.set(widget.get())
+            widget.destroy()
+            combo.pack(fill="x")
+            row_struct['val_widgets'] = [combo]
+
+        self.ensure_fields([field_name], then=show_values)
 
     def _add_criterion_row(self, criterion_data=None):
         row_frame = ttk.Frame(self.criteria_frame)
         row_frame.pack(fill="x", pady=2)
 
+        # 0. Заперечення критерію
+        negate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(row_frame, text="Not", variable=negate_var).pack(side="left", padx=2)
+
         # 1. Критерій (Дропдаун з усіма доступними метаданими)
         field_combo = ttk.Combobox(row_frame, values=self.available_criteria, width=15, state="readonly")
         field_combo.pack(side="left", padx=2)
@@ -1190,7 +1887,8 @@ class GroupEditorDialog(tk.Toplevel):
             'field': field_combo, 
             'op': op_combo, 
             'val_container': val_container,
-            'val_widgets': []
+            'val_widgets': [],
+            'negate': negate_var
         }
         self.criteria_rows.append(row_struct)
 
@@ -1264,6 +1962,7 @@ class GroupEditorDialog(tk.Toplevel):
             val = ttk.Combobox(container, width=10, values=unique_exts)
             val.pack(fill="x")
             row_struct['val_widgets'] = [val]
+            self._show_values_later(row_struct, crit)
 
         # === 2. SIZE (Підготовлений) ===
         elif crit in ["Size"]:
@@ -1310,6 +2009,25 @@ class GroupEditorDialog(tk.Toplevel):
             year.pack(side="left")
             row_struct['val_widgets'] = [days, month, year]
 
+        # === DUPLICATE (порівнює вміст файлів) ===
+        elif crit == "Duplicate":
+            row_struct['op']['values'] = ["is duplicate", "in duplicate group"]
+            row_struct['op'].set("is duplicate")
+            val = ttk.Combobox(container, width=6, values=["yes", "no"], state="readonly")
+            val.set("yes")
+            val.pack(side="left")
+            row_struct['val_widgets'] = [val]
+
+        # === CONTENT TYPE (MIME тип або сімейство, визначені за вмістом) ===
+        elif crit == "Content Type":
+            row_struct['op']['values'] = ["equals", "contains"]
+            row_struct['op'].set("equals")
+            val = ttk.Combobox(container, width=15,
+                               values=back.CONTENT_FAMILY_NAMES + self._get_unique_values_for_field(crit))
+            val.pack(fill="x")
+            row_struct['val_widgets'] = [val]
+            self._show_values_later(row_struct, crit, back.CONTENT_FAMILY_NAMES)
+
         # === 4. NAME (Підготовлений) ===
         elif crit == "Name":
             row_struct['op']['values'] = ["equals", "contains", "starts with", "ends with"]
@@ -1333,6 +2051,7 @@ class GroupEditorDialog(tk.Toplevel):
             
             val.pack(fill="x")
             row_struct['val_widgets'] = [val]
+            self._show_values_later(row_struct, crit)
 
     def _remove_criterion_row(self, row_frame):
         self.criteria_rows = [row for row in self.criteria_rows if row['frame'] != row_frame]
@@ -1341,8 +2060,21 @@ class GroupEditorDialog(tk.Toplevel):
     def _load_group_data(self, group):
         self.name_entry.insert(0, group['name'])
         self.dest_combo.set(group['destination'])
-        for c in group['criteria']:
+        criteria = group['criteria']
+        if len(criteria) == 1 and 'any' in criteria[0]:
+            self.match_combo.set("any")
+            criteria = criteria[0]['any']
+        for c in criteria:
+            negate = 'not' in c and 'field' in c['not']
+            if negate:
+                c = c['not']
+            if 'field' not in c:
+                self.kept_criteria.append(c)     #   all/any/not nodes made outside this dialog
+                continue
             self._add_criterion_row(c)
+            self.criteria_rows[-1]['negate'].set(negate)
+        if self.kept_criteria:
+            self.kept_label.configure(text=f"+{len(self.kept_criteria)} nested")
 
     def _on_save(self):
         name = self.name_entry.get().strip()
@@ -1386,9 +2118,15 @@ class GroupEditorDialog(tk.Toplevel):
             else:
                 if row['val_widgets']:
                     value = row['val_widgets'][0].get()
+                    value = self.value_labels.get(value, value)
 
             if field_backend and op and value:
-                criteria_list.append({'field': field_backend, 'operator': op, 'value': value})
+                criterion = {'field': field_backend, 'operator': op, 'value': value}
+                criteria_list.append({'not': criterion} if row['negate'].get() else criterion)
+
+        criteria_list += self.kept_criteria
+        if self.match_combo.get() == "any" and len(criteria_list) > 1:
+            criteria_list = [{'any': criteria_list}]
         
         self.result = {'name': name, 'destination': final_destination, 'criteria': criteria_list}
         self.destroy()
@@ -1396,11 +2134,12 @@ class GroupEditorDialog(tk.Toplevel):
 #region Group Manager
 class GroupsManager(ttk.Frame):
     """Group Panel"""
-    def __init__(self, parent, folder_tree_view, file_tree, file_data_source):
+    def __init__(self, parent, folder_tree_view, file_tree, file_data_source, ensure_fields=None):
         super().__init__(parent, style="TFrame")
         self.folder_tree_view = folder_tree_view
         self.file_tree = file_tree
         self.file_data_source = file_data_source # <--- Нове посилання на дані файлів
+        self.ensure_fields = ensure_fields
         self.groups = []
 
         # ... (код створення UI: listbox, btn_frame тощо залишається БЕЗ ЗМІН) ...
@@ -1435,7 +2174,7 @@ class GroupsManager(ttk.Frame):
         self.listbox.delete(0, "end")
         for group in self.groups:
             dest_folder = os.path.basename(group['destination']) if group['destination'] else "N/A"
-            criteria_fields = [c['field'] for c in group['criteria']]
+            criteria_fields = [c['field'] for c in back.criteria_leaves(group['criteria'])]
             if criteria_fields:
                 rules_text = f"by {', '.join(sorted(list(set(criteria_fields))))}"
             else:
@@ -1448,13 +2187,14 @@ class GroupsManager(ttk.Frame):
         root_path = self.folder_tree_view.get_root_path()
         
         # Отримуємо актуальні дані про файли з SortingPage
-        # file_data_list - це список словників
+        # file_data_list - це FileTable
         file_data_list = self.file_data_source 
 
         dialog = GroupEditorDialog(self, 
                                    available_folders=folder_paths, 
                                    file_data_list=file_data_list, # Передаємо дані
-                                   root_path=root_path)
+                                   root_path=root_path,
+                                   ensure_fields=self.ensure_fields)
         if dialog.result:
             self.groups.append(dialog.result)
             self._refresh_listbox()
@@ -1474,7 +2214,8 @@ class GroupsManager(ttk.Frame):
                                    available_folders=folder_paths, 
                                    group_to_edit=group_to_edit, 
                                    file_data_list=file_data_list, # Передаємо дані
-                                   root_path=root_path)
+                                   root_path=root_path,
+                                   ensure_fields=self.ensure_fields)
         if dialog.result:
             self.groups[index] = dialog.result
             self._refresh_listbox()
@@ -1743,14 +2484,12 @@ class LogsPage(tk.Frame):
         log_table_frame = ttk.Frame(main_content)
         log_table_frame.pack(fill="both", expand=True)
 
-        self.tree = ttk.Treeview(log_table_frame, style="Dark.Treeview",
-                                 columns=("Num", "Timestamp", "Status", "Source Path", "Destination Path"),
-                                 show="headings")
-        self.tree.pack(side="left", fill="both", expand=True)
-        
-        vsb = ttk.Scrollbar(log_table_frame, orient="vertical", command=self.tree.yview)
-        vsb.pack(side='right', fill='y')
-        self.tree.configure(yscrollcommand=vsb.set)
+        self.table = VirtualTable(log_table_frame, horizontal_scroll=False, style="Dark.Treeview",
+                                  columns=("Num", "Timestamp", "Status", "Source Path", "Destination Path"),
+                                  show="headings")
+        self.table.pack(side="left", fill="both", expand=True)
+        self.tree = self.table.tree
+        self._shown_logs = {}                   #   num -> log entry of the rows in the table
 
         #   Columns
         self.tree.heading("Num", text="#")
@@ -1765,7 +2504,7 @@ class LogsPage(tk.Frame):
         self.tree.column("Destination Path", width=250, stretch=True)
 
         #   Bind row selection to info show
-        self.tree.bind("<<TreeviewSelect>>", self._on_row_select)
+        self.table.bind("<<VirtualTableSelect>>", self._on_row_select)
 
         #   --- Lower Panel for details ---
         self.details_frame = ttk.LabelFrame(main_content, text="Issue Details", style="TLabelframe")
@@ -1826,33 +2565,31 @@ class LogsPage(tk.Frame):
         self.populate_log_table(filtered_data)
 
     def populate_log_table(self, data_to_display):
-        """Fill Table with data"""
-        self.tree.delete(*self.tree.get_children())
-        
-        for log_entry in reversed(data_to_display):
-            action = log_entry.get("action_type", "unknown")
-            dest_path = log_entry.get("dest_path", "") 
-            
-            self.tree.insert("", "end", iid=log_entry['num'],
-                             values=(
-                                log_entry.get("num", ""),
-                                log_entry.get("timestamp", ""),
-                                action.capitalize(),
-                                log_entry.get("src_path", "N/A"),
-                                dest_path,
-                                "☐"
-                            ), tags=(action,))
+        """Fill Table with data, newest first"""
+        self._shown_logs = {log_entry['num']: log_entry for log_entry in data_to_display}
+        self.table.set_rows([log_entry['num'] for log_entry in reversed(data_to_display)],
+                            self._log_values,
+                            lambda num: (self._shown_logs[num].get("action_type", "unknown"),))
+
+    def _log_values(self, num):
+        log_entry = self._shown_logs[num]
+        return (
+            log_entry.get("num", ""),
+            log_entry.get("timestamp", ""),
+            log_entry.get("action_type", "unknown").capitalize(),
+            log_entry.get("src_path", "N/A"),
+            log_entry.get("dest_path", ""),
+            "☐"
+        )
     
     def _on_row_select(self, event):
         """Show info on row select"""
-        selection = self.tree.selection()
-        print(selection)###
-        if not selection:
+        selected_num = self.table.focused()
+        if selected_num is None or not self.table.is_selected(selected_num):
             self.details_frame.pack_forget()
             return
         
-        selected_iid = selection[0]
-        log_entry = next((log for log in self.log_data if log['num'] == int(selected_iid)), None)
+        log_entry = self._shown_logs.get(selected_num)
 
         if log_entry:
             details_content = (
@@ -1871,34 +2608,27 @@ class LogsPage(tk.Frame):
 
     def _undo_action(self):
         """Sends undo request to backend"""
-        selection = self.tree.selection()
-        if not selection:
+        selected_ids = self.table.selection()
+        if not selected_ids:
             messagebox.showwarning(f"No selection", "Please select a log entry to undo.", parent=self)
             return
-
-        selected_ids = [int(iid) for iid in selection]
         
         back.undo_action(selected_ids, True)
         self.load_logs()
 
     def _delete_selected_log(self):
         """Deletes log from table"""
-        selection = self.tree.selection()
-        if not selection: 
+        selected_ids = self.table.selection()
+        if not selected_ids: 
             messagebox.showwarning(f"No selection", "Please select a log entry to delete.", parent=self)
             return
 
-        selected_ids = [int(iid) for iid in selection]
-
         back.delete_from_buffer(selected_ids, True)
         self.load_logs()
     
     def _select_all_logs(self):
         """Selects all logs"""
-        all_items = self.tree.get_children()
-        if all_items:
-            self.tree.selection_set(all_items)
-            print(all_items)
+        self.table.select_all()
 
     def _add_new_settings(self):
         settings_window = LogsSettings(self)
@@ -1976,7 +2706,8 @@ class RenamingMenu(tk.Frame):
         # --- ЄДИНА ТАБЛИЦЯ Treeview ---
         self.main_cols_ids = ("Name", "File size", "Date")
         
-        self.file_tree = ttk.Treeview(left_frame, show='headings', style="Dark.Treeview")
+        self.file_table = VirtualTable(left_frame, show='headings', style="Dark.Treeview")
+        self.file_tree = self.file_table.tree
         self.file_tree["columns"] = self.main_cols_ids
         
         self.file_tree.heading("Name", text="Name", anchor="w")
@@ -1989,15 +2720,8 @@ class RenamingMenu(tk.Frame):
         
         self.file_tree["displaycolumns"] = self.main_cols_ids
 
-        # --- Скролбари для єдиної таблиці ---
-        vsb = ttk.Scrollbar(left_frame, orient="vertical", command=self.file_tree.yview)
-        hsb = ttk.Scrollbar(left_frame, orient="horizontal", command=self.file_tree.xview)
-        
-        self.file_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-
-        vsb.pack(side='right', fill='y')
-        hsb.pack(side='bottom', fill='x')
-        self.file_tree.pack(side='left', fill='both', expand=True) # Пакет після скролбарів
+        self.file_table.pack(side='left', fill='both', expand=True)
+        self.file_tree.tag_configure('separator', background="#454545", foreground="#AAAAAA")
 
         self.all_columns = list(self.main_cols_ids) # Оновлюємо список всіх колонок
         
@@ -2198,10 +2922,6 @@ class RenamingMenu(tk.Frame):
         current_selection = self.file_type_combo.get()
         target_ext = current_selection.lower() if current_selection != "All" else None
 
-        self.file_tree.delete(*self.file_tree.get_children())
-        
-        self.file_tree.tag_configure('separator', background="#454545", foreground="#AAAAAA")
-
         found_extensions = set()
         display_data = []
 
@@ -2257,15 +2977,17 @@ class RenamingMenu(tk.Frame):
                 display_data.sort(key=lambda x: x['name'])
 
             separator_inserted = False
+            rows = []                           #   (values, tags) of every table row
 
             for item in display_data:
                 if target_ext and not separator_inserted and item['ext'] != target_ext:
-                    self.file_tree.insert("", "end", 
-                                          values=("--- Others ---", "", ""), 
-                                          tags=('separator',)) 
+                    rows.append((("--- Others ---", "", ""), ('separator',)))
                     separator_inserted = True
 
-                self.file_tree.insert("", "end", values=(item["name"], item["size"], item["date"]))
+                rows.append(((item["name"], item["size"], item["date"]), ()))
+
+            self.file_table.clear_selection()
+            self.file_table.set_rows(range(len(rows)), lambda i: rows[i][0], lambda i: rows[i][1])
                         
         except Exception as e:
             self.log_message(f"Error reading folder: {e}")   
@@ -2942,7 +3664,7 @@ class DesktopPage(tk.Frame):
     def _add_rule_from_inputs(self):
         """Create a dialog to create new window"""
         destinations = list(self.zones.keys())
-        criteria = ["Name", "Extension", "Size", "Date Created"]
+        criteria = ["Name", "Extension", "Size", "Date Created", "Content Type"]
         
         dialog = RuleEditorDialog(self, 
                                   available_destinations=destinations, 
@@ -3624,7 +4346,7 @@ class RuleEditorRow(ttk.Frame):
         
         #   --- Create vidgets ---
         self.crit_combo = ttk.Combobox(self, state="readonly", width=10,
-                                       values=["Extension", "Name", "Size (MB)", "Created (Days)"])
+                                       values=["Extension", "Name", "Size (MB)", "Created (Days)", "Content Type"])
         self.op_combo = ttk.Combobox(self, state="readonly", width=10,
                                      values=["equals", "contains", "greater than", "less than"])
         self.val_entry = ttk.Entry(self, width=10)
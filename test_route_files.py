@@ -0,0 +1,95 @@
+"""
+Differential test of route_files(): the NumPy path (_route_files_vectorized) must
+route exactly like the scalar path on random groups, nested any/all/not included.
+"""
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import back_function as back
+
+# Local day edges the date criteria below compare against, timestamps are put right on them
+DAY_EDGES = [edge + offset for day in (('31', '12', '2021'), ('1', '1', '2022'))
+             for edge in back.day_range_ns(*day) for offset in (-1, 0, 1)]
+
+
+def make_files(rng, count=3000):
+    """Synthetic FileRecords (nothing on disk) with metadata rows and duplicate roles"""
+    names = ['a.jpg', 'B.JPG', '.bashrc', 'x.tar.gz', 'noext', 'f.mp4', '..a', 'g.Mp3', 'h.txt']
+    records, metadata, duplicates = [], {}, {}
+    for i in range(count):
+        name = f'{i}{rng.choice(names)}' if rng.random() < 0.8 else rng.choice(names)
+        path = f'/nonexistent/d{i}/{name}'
+        stats = SimpleNamespace(
+            st_size=rng.choice([0, 1023, 1024, 1025, 5 * 1024 ** 2, rng.randint(0, 10 ** 10)]),
+            st_mtime_ns=rng.choice(DAY_EDGES + [DAY_EDGES[0] + rng.randint(-10 ** 14, 10 ** 14)]),
+            st_atime_ns=rng.choice(DAY_EDGES + [rng.randint(0, 2 * 10 ** 18)]),
+            st_ctime_ns=rng.choice(DAY_EDGES + [rng.randint(0, 2 * 10 ** 18)]),
+            st_birthtime_ns=rng.choice(DAY_EDGES + [rng.randint(0, 2 * 10 ** 18)]))
+        records.append(back.FileRecord(path, name, stats))
+        if rng.random() < 0.7:
+            metadata[path] = {
+                'Framerate': rng.choice([24, 25, 29.97, None, 'x', True, float('nan')]),
+                'Color Space': rng.choice(['RGB', 'CMYK', None, 1]),
+                'Content Type': rng.choice(['image/png', 'text/plain', None]),
+                'Bitrate (kbps)': rng.choice([128, 320, None]),
+            }
+        if rng.random() < 0.1:
+            duplicates[path] = rng.random() < 0.5
+    return records, metadata, duplicates
+
+
+def random_criterion(rng):
+    return rng.choice([
+        {'field': 'Extension', 'operator': rng.choice(['equals', 'equals', 'contains']),
+         'value': rng.choice(['.jpg', '.JPG', '.gz', '', '.mp3', '.zzz'])},
+        {'field': 'Name', 'operator': rng.choice(['equals', 'contains']), 'value': rng.choice(['a.jpg', '1', 'noext'])},
+        {'field': 'Size', 'operator': rng.choice(['greater than', 'less than', 'equals']),
+         'value': [rng.choice([0, 1, 5, 1.5, 'x']), rng.choice(['KB', 'MB', 'GB', 'B'])]},
+        {'field': 'Color Space', 'operator': rng.choice(['equals', 'contains']), 'value': rng.choice(['RGB', 'CMYK', '1'])},
+        {'field': rng.choice(['Framerate', 'Bitrate (kbps)']),
+         'operator': rng.choice(['greater than', 'less than', 'equals', 'contains']),
+         'value': rng.choice(['24', '25', '29.97', 'x', '128', '1'])},
+        {'field': rng.choice(['Modified', 'Created', 'Accessed']),
+         'operator': rng.choice(['greater than', 'less than', 'equals', 'x']),
+         'value': rng.choice([['1', '1', '2022'], ['31', '12', '2021'], ['x', '1', '2']])},
+        {'field': 'Duplicate', 'operator': rng.choice(['is duplicate', 'in duplicate group', 'x']),
+         'value': rng.choice(['yes', 'no'])},
+        {'field': 'Content Type', 'operator': rng.choice(['equals', 'contains']),
+         'value': rng.choice(['image', 'text/plain', 'png'])},
+        {'field': 'Bogus', 'operator': 'equals', 'value': 'x'},
+    ])
+
+
+def random_node(rng, depth=0):
+    roll = rng.random()
+    if depth < 2 and roll < 0.15:
+        return {'any': [random_node(rng, depth + 1) for _ in range(rng.randint(0, 3))]}
+    if depth < 2 and roll < 0.25:
+        return {'all': [random_node(rng, depth + 1) for _ in range(rng.randint(0, 3))]}
+    if depth < 2 and roll < 0.35:
+        return {'not': random_node(rng, depth + 1)}
+    return random_criterion(rng)
+
+
+@unittest.skipIf(back.numpy is None, "NumPy is not installed")
+class VectorizedRoutingTest(unittest.TestCase):
+    TRIALS = 200
+
+    def test_same_routes_as_scalar_path(self):
+        rng = random.Random(20240)
+        records, metadata, duplicates = make_files(rng)
+        for trial in range(self.TRIALS):
+            groups = [{'destination': f'/out{number}',
+                       'criteria': [random_node(rng) for _ in range(rng.randint(0, 3))]}
+                      for number in range(rng.randint(1, 6))]
+            with mock.patch.object(back, 'VECTORIZE_MIN_FILES', 0):
+                vectorized = back.route_files(records, groups, metadata, duplicates)
+            with mock.patch.object(back, 'numpy', None):
+                scalar = back.route_files(records, groups, metadata, duplicates)
+            self.assertEqual(vectorized, scalar, f"trial {trial}: {groups}")
+
+
+if __name__ == '__main__':
+    unittest.main()